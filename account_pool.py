@@ -0,0 +1,116 @@
+import asyncio
+import time
+import logging
+from config import USERBOT_DRAIN_METHODS
+
+logger = logging.getLogger(__name__)
+
+class UserbotAccount:
+    """Один аккаунт UserBot: клиент, анализатор, лимитер, кэш и счетчики"""
+
+    def __init__(self, name, client, analyzer, limiter, entity_cache, max_load):
+        self.name = name
+        self.client = client
+        self.analyzer = analyzer
+        self.limiter = limiter
+        self.entity_cache = entity_cache
+        self.max_load = max_load
+        self.active = 0
+        self.done = 0
+        self.failed = 0
+        self.banned_reason = None
+        self.started_at = time.time()
+
+    def drained_for(self):
+        """Сколько секунд аккаунт еще на паузе FloodWait - новые группы пока отдаем другим аккаунтам"""
+        return max(self.limiter.parked_for(method) for method in USERBOT_DRAIN_METHODS)
+
+    def is_alive(self):
+        """Аккаунт не заблокирован и не потерял сессию"""
+        return self.banned_reason is None and self.limiter.fatal_error is None
+
+    def is_usable(self):
+        """Аккаунт может прямо сейчас выполнять запросы"""
+        return self.is_alive() and self.drained_for() <= 0
+
+    def is_available(self):
+        """Аккаунту можно выдать еще одну группу"""
+        return self.is_usable() and self.active < self.max_load
+
+    def ban(self, reason):
+        """Аккаунт заблокирован или разлогинен - больше его не используем"""
+        if self.banned_reason is None:
+            self.banned_reason = reason
+            logger.error(f"⛔ Аккаунт {self.name} отключен: {reason}")
+
+    def summary(self):
+        hours = max((time.time() - self.started_at) / 3600, 1 / 60)
+        if not self.is_alive():
+            state = "отключен"
+        elif self.drained_for() > 0:
+            state = f"пауза {self.drained_for():.0f} сек"
+        else:
+            state = "в работе"
+        return (
+            f"{self.name}: {state}, в обработке {self.active}/{self.max_load}, "
+            f"готово {self.done}, ошибок {self.failed}, {self.done / hours:.1f} групп/час"
+        )
+
+class AccountPool:
+    """Пул аккаунтов UserBot: каждая группа достается наименее загруженному доступному аккаунту"""
+
+    def __init__(self):
+        self.accounts = []
+        self._changed = None
+
+    def add(self, account):
+        self.accounts.append(account)
+
+    def _condition(self):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def _pick(self):
+        available = [account for account in self.accounts if account.is_available()]
+        if not available:
+            return None
+        # Меньше всего групп в обработке, при равенстве - меньше всего уже обработано
+        return min(available, key=lambda account: (account.active / account.max_load, account.done))
+
+    async def acquire(self, poll_interval=5):
+        """Ждем аккаунт, которому можно выдать следующую группу (None - рабочих аккаунтов нет)"""
+        changed = self._condition()
+        async with changed:
+            while True:
+                if not self.has_usable_accounts():
+                    return None
+
+                account = self._pick()
+                if account is not None:
+                    account.active += 1
+                    return account
+
+                # Пауза FloodWait заканчивается сама, поэтому ждем не только release()
+                try:
+                    await asyncio.wait_for(changed.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, account, success=None):
+        """Возвращаем аккаунт в пул (success=None - группа не обрабатывалась)"""
+        account.active -= 1
+        if success is True:
+            account.done += 1
+        elif success is False:
+            account.failed += 1
+
+        changed = self._condition()
+        async with changed:
+            changed.notify_all()
+
+    def has_usable_accounts(self):
+        return any(account.is_alive() for account in self.accounts)
+
+    def summary(self):
+        return "; ".join(account.summary() for account in self.accounts)
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from telegram import ChatMember, ChatMemberAdministrator
+
+logger = logging.getLogger(__name__)
+
+class AdminRightsWatcher:
+    """Ожидание прав администратора по обновлениям my_chat_member вместо опроса get_chat_member"""
+
+    def __init__(self):
+        self.waiters = {}
+
+    def _resolve(self, chat_id, member):
+        for future in self.waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(member)
+
+    async def handle_update(self, update, context):
+        """Обработчик ChatMemberHandler.MY_CHAT_MEMBER"""
+        change = update.my_chat_member
+        if change is None:
+            return
+
+        member = change.new_chat_member
+        chat_id = change.chat.id
+        if isinstance(member, ChatMemberAdministrator):
+            logger.info(f"✅ Бот получил права администратора в чате {chat_id}")
+            self._resolve(chat_id, member)
+        elif member.status in (ChatMember.LEFT, ChatMember.BANNED):
+            logger.info(f"🚪 Бота удалили из чата {chat_id}")
+            self._resolve(chat_id, None)
+
+    async def wait_for_admin(self, bot, chat_id, timeout):
+        """Ждем прав администратора: одна проверка get_chat_member, дальше - только обновления"""
+        # Регистрируемся до проверки, чтобы не пропустить повышение между ними
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(chat_id, []).append(future)
+
+        try:
+            try:
+                member = await bot.get_chat_member(chat_id, bot.id)
+                if isinstance(member, ChatMemberAdministrator):
+                    logger.info(f"✅ Бот уже администратор в чате {chat_id}")
+                    return True, member
+            except Exception as e:
+                logger.error(f"❌ Ошибка проверки прав в чате {chat_id}: {e}")
+
+            logger.info(f"🕐 Жду прав администратора в чате {chat_id} (до {timeout} сек)")
+            try:
+                member = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⏰ Права администратора в чате {chat_id} не выданы за {timeout} сек")
+                return False, None
+
+            return member is not None, member
+
+        finally:
+            waiters = self.waiters.get(chat_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self.waiters[chat_id]
+
+# Глобальный наблюдатель за правами бота в группах
+admin_watcher = AdminRightsWatcher()
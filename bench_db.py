@@ -0,0 +1,141 @@
+"""Бенчмарк записи в groups.db: до и после перевода базы на WAL и пакетную запись
+
+До: журнал отката (delete), отдельное соединение и COMMIT на каждую запись,
+как в исходных синхронных функциях database.py.
+После: init_db() (WAL и миграции), пул соединений и WriteBatcher.
+Дополнительно два процесса одновременно пишут в одну базу - ошибок
+"database is locked" быть не должно.
+
+Запуск: python bench_db.py [--writes 400] [--process-writes 1500]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import database
+from config import DB_POOL_SIZE, DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'groups.db')
+
+# Запись результата в исходной схеме (без queue_id)
+SQL_SAVE_CHECK_RESULT_BEFORE = '''INSERT INTO group_checks
+        (group_id, group_title, user_id, bot_check_result, userbot_check_result, final_result, issues)
+        VALUES (?, ?, ?, ?, ?, ?, ?)'''
+
+def prepare_queue(path, count):
+    """Строки очереди, статусы которых будет обновлять бенчмарк"""
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO check_queue (group_id, group_title, user_id, invite_link) VALUES (?, ?, ?, ?)',
+        [(-100 - i, f'bench {i}', 1, 'https://t.me/+bench') for i in range(count)]
+    )
+    conn.commit()
+    first_id = conn.execute('SELECT MAX(id) FROM check_queue').fetchone()[0] - count + 1
+    conn.close()
+    return list(range(first_id, first_id + count))
+
+def result_json(i):
+    return json.dumps({'group_year': 2020, 'messages': i})
+
+def bench_before(path, writes):
+    """Журнал отката, одно соединение и один COMMIT на запись"""
+    queue_ids = prepare_queue(path, writes)
+
+    def write(sql, params):
+        conn = sqlite3.connect(path)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    started_at = time.perf_counter()
+    for i, queue_id in enumerate(queue_ids):
+        write(database.SQL_UPDATE_QUEUE_STATUS, ('userbot_done', queue_id))
+        write(SQL_SAVE_CHECK_RESULT_BEFORE, (-100 - i, 'bench', 1, '{}', result_json(i), False, ''))
+    return time.perf_counter() - started_at
+
+async def run_batched_writes(path, queue_ids):
+    """Одновременные записи статусов и результатов через пул и WriteBatcher"""
+    pool = database.ConnectionPool(path, DB_POOL_SIZE)
+    batcher = database.WriteBatcher(pool, DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY)
+    writes = []
+    for i, queue_id in enumerate(queue_ids):
+        writes.append(batcher.submit(database.SQL_UPDATE_QUEUE_STATUS, ('userbot_done', queue_id)))
+        writes.append(batcher.submit(
+            database.SQL_SAVE_CHECK_RESULT,
+            (queue_id, -100 - i, 'bench', 1, '{}', result_json(i), False, '')
+        ))
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*writes, return_exceptions=True)
+    elapsed = time.perf_counter() - started_at
+    await pool.close()
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    return elapsed, errors, batcher.batches
+
+def bench_after(path, writes):
+    """WAL, пул соединений и пакетная запись"""
+    database.DB_FILE = path
+    database.init_db()
+    queue_ids = prepare_queue(path, writes)
+    return asyncio.run(run_batched_writes(path, queue_ids))
+
+def process_writer(path, writes, name, barrier, results):
+    queue_ids = prepare_queue(path, writes)
+    # Оба процесса начинают писать одновременно
+    barrier.wait()
+    elapsed, errors, _ = asyncio.run(run_batched_writes(path, queue_ids))
+    results.put((name, writes * 2, elapsed, [str(error) for error in errors]))
+
+def bench_two_processes(path, writes):
+    """Два процесса (основной бот и UserBot) одновременно пишут в одну базу"""
+    results = multiprocessing.Queue()
+    barrier = multiprocessing.Barrier(2)
+    processes = [
+        multiprocessing.Process(target=process_writer, args=(path, writes, name, barrier, results))
+        for name in ('бот', 'UserBot')
+    ]
+    for process in processes:
+        process.start()
+    outcome = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return outcome
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк записи в groups.db")
+    parser.add_argument("--writes", type=int, default=400, help="Обновлений статуса (и столько же результатов)")
+    parser.add_argument("--process-writes", type=int, default=1500, help="Пар записей на процесс в тесте блокировок")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_db = os.path.join(tmp, 'before.db')
+        after_db = os.path.join(tmp, 'after.db')
+        shared_db = os.path.join(tmp, 'shared.db')
+        for path in (before_db, after_db, shared_db):
+            shutil.copy(BASELINE_DB, path)
+
+        total = args.writes * 2
+        before = bench_before(before_db, args.writes)
+        print(f"🐢 До (журнал отката, COMMIT на запись): {total} записей за {before:.2f} сек - {total / before:,.0f} записей/сек")
+
+        after, errors, batches = bench_after(after_db, args.writes)
+        print(
+            f"🚀 После (WAL + WriteBatcher): {total} записей за {after:.2f} сек - {total / after:,.0f} записей/сек, "
+            f"{batches} транзакций, ошибок {len(errors)}"
+        )
+
+        database.DB_FILE = shared_db
+        database.init_db()
+        for name, count, elapsed, process_errors in bench_two_processes(shared_db, args.process_writes):
+            print(f"🔒 Процесс {name}: {count} записей за {elapsed:.2f} сек, ошибок {len(process_errors)}")
+            for error in process_errors[:3]:
+                print(f"   ❌ {error}")
+
+if __name__ == "__main__":
+    main()
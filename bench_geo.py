@@ -0,0 +1,91 @@
+"""Микробенчмарк поиска гео-признаков в названиях групп
+
+Сравнивает скомпилированный GeoMatcher с прежним линейным поиском
+подстрок: по старому списку из 20 слов и по всем вариантам словаря
+GEO_ALIASES.
+
+Запуск: python bench_geo.py [--titles 10000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from config import GEO_ALIASES
+from geo_signals import GeoMatcher, STEM_MARK
+
+# Список из прежнего main_bot.check_geo_by_name
+OLD_KEYWORDS = [
+    'город', 'city', 'москва', 'спб', 'киев', 'moscow', 'kiev', 'питер',
+    'санкт-петербург', 'минск', 'казахстан', 'украина', 'россия', 'russia',
+    'ukraine', 'беларусь', 'belarus', 'казань', 'новосибирск', 'екатеринбург'
+]
+
+WORDS = [
+    'чат', 'группа', 'новости', 'клуб', 'обмен', 'продажа', 'работа', 'крипто',
+    'фото', 'музыка', 'игры', 'chat', 'news', 'club', 'trade', 'crypto', 'velocity',
+    'маркет', 'барахолка', 'вакансии', 'любители', 'котики', 'flood', 'official'
+]
+
+GEO_WORDS = [
+    'Москвы', 'Московский', 'СПб', 'Питерские', 'Киеве', 'Kyiv', 'Минск', 'Казани',
+    'Новосибирска', 'Екатеринбург', 'России', 'Україна', 'Belarus', 'City', 'Алматы'
+]
+
+def make_titles(count, seed=1):
+    """Названия групп: примерно каждое пятое - с гео-признаком"""
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(count):
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        if rng.random() < 0.2:
+            words.insert(rng.randint(0, len(words)), rng.choice(GEO_WORDS))
+        titles.append(" ".join(words))
+    return titles
+
+def linear_scan(keywords):
+    def find(title):
+        title_lower = title.lower()
+        return [kw for kw in keywords if kw in title_lower]
+    return find
+
+def measure(find, titles, repeat):
+    """Лучшее время из repeat прогонов и число названий с совпадениями"""
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        matched = sum(1 for title in titles if find(title))
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best, matched
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк поиска гео-признаков")
+    parser.add_argument("--titles", type=int, default=10000, help="Сколько названий проверить")
+    parser.add_argument("--repeat", type=int, default=5, help="Прогонов, берется лучший")
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles)
+    all_variants = [
+        variant.lower().rstrip(STEM_MARK)
+        for variants in GEO_ALIASES.values() for variant in variants
+    ]
+
+    started_at = time.perf_counter()
+    matcher = GeoMatcher(GEO_ALIASES)
+    compile_ms = (time.perf_counter() - started_at) * 1000
+
+    cases = [
+        (f"Подстроки, старый список ({len(OLD_KEYWORDS)} слов)", linear_scan(OLD_KEYWORDS)),
+        (f"Подстроки, весь словарь ({len(all_variants)} вариантов)", linear_scan(all_variants)),
+        (f"GeoMatcher ({len(all_variants)} вариантов)", matcher.find),
+    ]
+
+    print(f"📝 {len(titles)} названий, GeoMatcher скомпилирован за {compile_ms:.1f} мс")
+    for name, find in cases:
+        elapsed, matched = measure(find, titles, args.repeat)
+        print(
+            f"⏱️ {name}: {elapsed * 1000:.1f} мс, "
+            f"{len(titles) / elapsed:,.0f} названий/сек, совпадений {matched}"
+        )
+
+if __name__ == "__main__":
+    main()
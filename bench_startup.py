@@ -0,0 +1,104 @@
+"""Бенчмарк запуска системы: два процесса против одного (--single-process)
+
+Дочерние процессы создаются так же, как их запускает Supervisor из main.py
+(multiprocessing, метод spawn, как на Windows). Каждый процесс проходит
+запуск до первого обращения к Telegram: импорт модулей, сборка приложения
+основного бота и клиентов аккаунтов UserBot. Сеть и авторизованные сессии
+не нужны - файлы сессий создаются во временной папке.
+Для каждого режима печатается время до готовности и память (RSS) дочерних
+процессов; процесс супервизора в обоих режимах одинаковый и не учитывается.
+
+Запуск: python bench_startup.py [--runs 3]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+def rss_mb():
+    """Резидентная память текущего процесса в МБ (None, если узнать нельзя)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # На Linux ru_maxrss в КБ, на macOS - в байтах
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+def start_bot():
+    from main_bot import build_application
+    build_application()
+
+def start_userbot():
+    from telethon import TelegramClient
+    from config import USERBOT_SESSION_FILES, USERBOT_API_ID, USERBOT_API_HASH
+    from userbot import create_account
+    for session_file in USERBOT_SESSION_FILES:
+        create_account(session_file, TelegramClient(session_file, USERBOT_API_ID, USERBOT_API_HASH))
+
+def start_single():
+    from sync_manager import use_in_process_channel
+    use_in_process_channel()
+    start_bot()
+    start_userbot()
+
+def child(target, workdir, conn):
+    """Дочерний процесс: запуск до готовности, затем сообщаем память родителю"""
+    os.chdir(workdir)
+    target()
+    conn.send(rss_mb())
+    conn.close()
+
+def run_mode(targets):
+    """Запускаем процессы режима одновременно; время до готовности - по последнему из них"""
+    with tempfile.TemporaryDirectory() as workdir:
+        started_at = time.perf_counter()
+        children = []
+        for target in targets:
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=child, args=(target, workdir, child_conn))
+            process.start()
+            child_conn.close()
+            children.append((process, parent_conn))
+
+        memory = [conn.recv() for _, conn in children]
+        elapsed = time.perf_counter() - started_at
+        for process, _ in children:
+            process.join()
+    return elapsed, memory
+
+def format_memory(memory):
+    if None in memory:
+        return "память: н/д"
+    parts = " + ".join(f"{value:.0f}" for value in memory)
+    return f"память: {parts} = {sum(memory):.0f} МБ" if len(memory) > 1 else f"память: {parts} МБ"
+
+def report(title, runs):
+    times = [elapsed for elapsed, _ in runs]
+    _, memory = runs[-1]
+    print(f"{title}: готовность за {statistics.median(times):.2f} сек (медиана из {len(runs)}), {format_memory(memory)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска: два процесса против одного")
+    parser.add_argument("--runs", type=int, default=3, help="Запусков каждого режима")
+    args = parser.parse_args()
+
+    # Supervisor на Windows запускает процессы только через spawn - меряем так же на любой ОС
+    multiprocessing.set_start_method('spawn')
+
+    two = [run_mode([start_bot, start_userbot]) for _ in range(args.runs)]
+    report("👥 Два процесса (бот + UserBot)", two)
+
+    single = [run_mode([start_single]) for _ in range(args.runs)]
+    report("🧩 Один процесс (--single-process)", single)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Бенчмарк приема обновлений основным ботом через webhook
+
+Поднимает настоящий сервер webhook python-telegram-bot на локальном порту
+и отправляет в него пачку обновлений, как это делает Telegram. Bot API
+заменен локальной заглушкой, сеть не нужна. Обработчик имитирует
+медленный обработчик (ожидание БД или Bot API) и считает обновления.
+
+Запуск: python bench_updates.py [--updates 500] [--delay 0.05] [--senders 20]
+Нужен tornado: pip install "python-telegram-bot[webhooks]"
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import socket
+import time
+import httpx
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+from telegram.request import BaseRequest
+from config import BOT_CONCURRENT_UPDATES, BOT_WEBHOOK_PATH
+
+BOT_ID = 1000
+
+class LocalBotAPI(BaseRequest):
+    """Заглушка Bot API: отвечает на служебные методы без обращения к Telegram"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        if api_method == "getMe":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        else:
+            # setWebhook, deleteWebhook и прочее - просто подтверждаем
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+def make_update(update_id):
+    """Обновление с сообщением в группе - как при добавлении бота"""
+    chat_id = -1000000000000 - update_id
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"bench {update_id}"},
+            "from": {"id": 10 + update_id, "is_bot": False, "first_name": "user"},
+            "text": "ping"
+        }
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_case(concurrent_updates, updates, delay, senders):
+    """Обновлений в секунду при заданной параллельности обработки"""
+    handled = 0
+    all_handled = asyncio.Event()
+
+    async def slow_handler(update, context):
+        nonlocal handled
+        await asyncio.sleep(delay)
+        handled += 1
+        if handled == updates:
+            all_handled.set()
+
+    application = (
+        Application.builder()
+        .token(f"{BOT_ID}:bench")
+        .request(LocalBotAPI())
+        .get_updates_request(LocalBotAPI())
+        .concurrent_updates(concurrent_updates)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.ALL, slow_handler))
+
+    port = free_port()
+    secret = secrets.token_urlsafe(16)
+    url = f"http://127.0.0.1:{port}/{BOT_WEBHOOK_PATH}"
+
+    await application.initialize()
+    await application.updater.start_webhook(
+        listen="127.0.0.1", port=port, url_path=BOT_WEBHOOK_PATH,
+        webhook_url=url, secret_token=secret, allowed_updates=Update.ALL_TYPES
+    )
+    await application.start()
+
+    # Telegram держит до max_connections соединений к webhook - имитируем несколько отправителей
+    pending = asyncio.Queue()
+    for update_id in range(1, updates + 1):
+        pending.put_nowait(make_update(update_id))
+
+    async def sender(client):
+        while not pending.empty():
+            response = await client.post(
+                url, json=pending.get_nowait(),
+                headers={"X-Telegram-Bot-Api-Secret-Token": secret}
+            )
+            response.raise_for_status()
+
+    started_at = time.monotonic()
+    async with httpx.AsyncClient() as client:
+        await asyncio.gather(*(sender(client) for _ in range(senders)))
+    accepted_at = time.monotonic()
+    await all_handled.wait()
+    finished_at = time.monotonic()
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+
+    return accepted_at - started_at, finished_at - started_at
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк приема обновлений через webhook")
+    parser.add_argument("--updates", type=int, default=500, help="Сколько обновлений отправить")
+    parser.add_argument("--delay", type=float, default=0.05, help="Время работы обработчика, сек")
+    parser.add_argument("--senders", type=int, default=20, help="Одновременных соединений отправителя")
+    args = parser.parse_args()
+
+    print(f"📨 {args.updates} обновлений, обработчик {args.delay * 1000:.0f} мс, {args.senders} соединений")
+    for concurrent_updates in (1, BOT_CONCURRENT_UPDATES):
+        accepted, total = await run_case(concurrent_updates, args.updates, args.delay, args.senders)
+        print(
+            f"⚙️ concurrent_updates={concurrent_updates}: принято за {accepted:.2f} сек, "
+            f"обработано за {total:.2f} сек - {args.updates / total:.0f} обновлений/сек"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
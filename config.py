@@ -4,8 +4,149 @@ BOT_TOKEN = "8364760741:AAF_ZsJzTWtU0S1yBMojyOjH_oYcA9HPhds"
 USERBOT_API_ID = 36310732  # Ваш API ID
 USERBOT_API_HASH = "961309c56e390e0e937b0f333e72e9b4" 
 USERBOT_SESSION_FILE = "userbot"  
+# Сессии пула аккаунтов UserBot (первая - основная сессия)
+USERBOT_SESSION_FILES = [USERBOT_SESSION_FILE]
 
 ADMIN_ID = 8262248895  
 # Настройки проверок
 WEB_CHECK_MIN_DIFF = 50  
 MAX_WAIT_TIME = 300  
+# Настройки базы данных
+DB_POOL_SIZE = 4  # Соединений в пуле на каждый процесс
+DB_BUSY_TIMEOUT = 10  # Сколько секунд ждать блокировку базы другим процессом
+DB_WRITE_BATCH_SIZE = 50  # Максимум записей в одной транзакции
+DB_WRITE_BATCH_DELAY = 0.05  # Сколько секунд копить записи перед фиксацией
+# Локальный канал уведомлений UserBot -> основной бот
+RESULT_CHANNEL_HOST = "127.0.0.1"
+RESULT_CHANNEL_PORT = 8787
+# Настройки обработки очереди UserBot
+USERBOT_CONCURRENCY = 3  # Сколько групп один аккаунт UserBot проверяет одновременно
+USERBOT_CHECK_TIMEOUT = 180  # Максимум секунд на проверку одной группы
+USERBOT_QUEUE_POLL_INTERVAL = 5  # Пауза между запросами к пустой очереди
+USERBOT_JOIN_SETTLE_DELAY = 1  # Пауза после вступления в группу перед анализом
+# Лимиты запросов UserBot: метод -> (запросов в минуту, размер пачки)
+USERBOT_RATE_LIMITS = {
+    'default': (30, 5),
+    'get_entity': (30, 5),
+    'get_messages': (40, 10),
+    'GetMessagesRequest': (120, 24),  # Пачки ID при поиске даты создания: весь поиск по группе - одна пачка
+    'get_participants': (15, 3),
+    'GetHistoryRequest': (120, 10),  # Страницы глубокой проверки истории
+    'GetFullChannelRequest': (20, 5),
+    'GetFullChatRequest': (20, 5),
+    'JoinChannelRequest': (3, 1),
+    'ImportChatInviteRequest': (3, 1),
+    'LeaveChannelRequest': (6, 2),
+    'delete_dialog': (6, 2),
+    'GetDialogsRequest': (10, 3),  # Страницы списка диалогов при уборке
+}
+USERBOT_MAX_FLOOD_WAIT = 120  # Более долгий FloodWait не ждем, а считаем шаг неудачным
+# Методы вступления и анализа: пока любой из них на паузе FloodWait, новые группы аккаунту не выдаем
+USERBOT_DRAIN_METHODS = (
+    'ImportChatInviteRequest', 'JoinChannelRequest',
+    'get_entity', 'get_messages', 'GetFullChannelRequest',
+)
+USERBOT_STATS_INTERVAL = 600  # Как часто писать счетчики лимитера в лог (сек)
+# Окна сообщений, которые UserBot загружает для анализа группы
+MESSAGE_WINDOW_SIZE = 100  # Последние сообщения (импорт, статистика)
+OLDEST_WINDOW_SIZE = 10  # Самые старые сообщения (дата создания)
+# Глубокая проверка всей истории на импортированные сообщения (по умолчанию выключена)
+USERBOT_DEEP_SCAN = False
+DEEP_SCAN_MAX_MESSAGES = 20000  # Максимум сообщений за одну глубокую проверку
+DEEP_SCAN_MAX_SECONDS = 60  # Максимум секунд на одну глубокую проверку
+# Поиск даты создания группы по ID сообщений
+CREATION_PROBE_BATCH_SIZE = 100  # ID сообщений в одном запросе
+CREATION_PROBE_MAX_CALLS = 24  # Максимум запросов на одну группу
+# Кэш сущностей групп UserBot (хранится в groups.db)
+ENTITY_CACHE_SIZE = 1000  # Записей в памяти
+ENTITY_CACHE_TTL = 7 * 24 * 3600  # Срок жизни записи (сек)
+# Настройки планировщика очереди проверок
+QUEUE_PRIORITY_ADMIN = 10  # Приоритет проверок, запущенных администратором
+QUEUE_AGING_SECONDS = 60  # Каждые N секунд ожидания поднимают приоритет проверки на 1
+QUEUE_MAX_ATTEMPTS = 3  # Сколько раз пытаемся вступить в группу, прежде чем считать проверку неудачной
+QUEUE_RETRY_BASE_DELAY = 30  # Пауза перед первой повторной попыткой (сек), дальше удваивается
+QUEUE_WAIT_SAMPLE_SIZE = 200  # По скольким последним проверкам считать время ожидания в очереди
+# Настройки очереди выхода из групп
+LEAVE_BATCH_SIZE = 5  # Сколько выходов UserBot выполняет за один проход
+LEAVE_QUEUE_INTERVAL = 30  # Пауза между проходами очереди выхода (сек)
+LEAVE_SWEEP_INTERVAL = 3600  # Как часто сверять список диалогов и выходить из ненужных групп (сек)
+# Настройки супервизора процессов (main.py)
+SUPERVISOR_BACKOFF_BASE = 1  # Пауза перед первым перезапуском (сек), дальше удваивается
+SUPERVISOR_BACKOFF_MAX = 300  # Максимальная пауза перед перезапуском (сек)
+SUPERVISOR_STABLE_TIME = 60  # Процесс, проработавший дольше (сек), снова перезапускается без паузы
+SUPERVISOR_CRASH_LOOP_MAX = 5  # Столько падений за окно - это цикл падений
+SUPERVISOR_CRASH_LOOP_WINDOW = 300  # Окно подсчета падений (сек)
+SUPERVISOR_CIRCUIT_COOLDOWN = 900  # На сколько прекращаем перезапуски при цикле падений (сек)
+HEARTBEAT_INTERVAL = 5  # Как часто дочерний процесс сообщает, что жив (сек)
+HEARTBEAT_TIMEOUT = 30  # Без сигнала дольше (сек) процесс считается зависшим
+HEARTBEAT_STARTUP_GRACE = 90  # Сколько ждать первого сигнала после запуска процесса (сек)
+ADMIN_WAIT_TIMEOUT = 60  # Сколько ждать выдачи боту прав администратора в группе (сек)
+# Сколько проверок одновременно проходит каждый этап подключения группы
+ONBOARDING_STAGE_LIMITS = {
+    'admin_check': 100,  # Ожидание прав - обновления my_chat_member, почти без запросов
+    'invite': 5,  # Создание пригласительной ссылки
+    'enqueue': 10,  # Запись в очередь проверок
+    'wait': 500,  # Ожидание UserBot - только future, без запросов
+    'web_check': 50,  # Веб-проверка - без запросов
+    'report': 5,  # Формирование и отправка отчета
+}
+STATUS_EDIT_INTERVAL = 3  # Не чаще одного редактирования статусного сообщения группы за столько секунд
+
+# Очередь исходящих сообщений Bot API
+SEND_QUEUE_WORKERS = 8  # Одновременных запросов на отправку
+SEND_GLOBAL_RATE = (25, 5)  # Всего сообщений в секунду (с запасом до лимита ~30), размер пачки
+SEND_RATE_LIMITS = {  # Сообщений в минуту на чат, размер пачки
+    'group': (20, 3),
+    'private': (60, 3),
+}
+SEND_MAX_RETRIES = 3  # Повторов после RetryAfter
+SEND_LATENCY_SAMPLE_SIZE = 500  # Последних отправок для p50/p95 задержки
+
+# Получение обновлений основным ботом
+BOT_CONCURRENT_UPDATES = 64  # Обновлений, обрабатываемых одновременно
+BOT_WEBHOOK_URL = None  # Публичный HTTPS-адрес бота, например "https://bot.example.com" (None - long polling)
+BOT_WEBHOOK_LISTEN = "127.0.0.1"  # Локальный адрес сервера webhook (HTTPS завершает обратный прокси)
+BOT_WEBHOOK_PORT = 8080
+BOT_WEBHOOK_PATH = "telegram"  # Путь webhook: BOT_WEBHOOK_URL/BOT_WEBHOOK_PATH
+BOT_WEBHOOK_SECRET = None  # Заголовок X-Telegram-Bot-Api-Secret-Token (None - случайный при каждом запуске)
+
+# Гео-признаки в названии группы: каноническое название -> варианты написания
+# Вариант со * на конце - основа слова с любым окончанием (падежи, прилагательные).
+# Для коротких и неоднозначных основ падежи перечислены явно: "ростов*" нашел бы
+# "ростовщики", "самар*" - "Самарканд".
+# Совпадение только целым словом: "city" не найдется в "velocity".
+GEO_ALIASES = {
+    'город': ['город*', 'city', 'gorod'],
+    'Москва': ['москв*', 'московск*', 'мск', 'moscow', 'moskva', 'msk'],
+    'Санкт-Петербург': ['санкт-петербург*', 'петербург*', 'питер', 'питера', 'питеру', 'питере', 'питером', 'питерск*', 'спб', 'petersburg', 'saint-petersburg', 'piter', 'spb'],
+    'Киев': ['киев*', 'київ*', 'kiev', 'kyiv'],
+    'Минск': ['минск*', 'minsk'],
+    'Казань': ['казань', 'казани', 'казанью', 'казанск*', 'kazan'],
+    'Новосибирск': ['новосиб*', 'novosibirsk', 'nsk'],
+    'Екатеринбург': ['екатеринбург*', 'екб', 'ekaterinburg', 'yekaterinburg', 'ekb'],
+    'Нижний Новгород': ['нижний новгород*', 'нижнего новгород*', 'нижнем новгород*', 'nizhny novgorod'],
+    'Самара': ['самара', 'самары', 'самаре', 'самару', 'самарой', 'самарск*', 'samara'],
+    'Ростов-на-Дону': ['ростов', 'ростова', 'ростову', 'ростове', 'ростовом', 'ростовск*', 'rostov'],
+    'Краснодар': ['краснодар*', 'krasnodar'],
+    'Красноярск': ['красноярск*', 'krasnoyarsk'],
+    'Челябинск': ['челябинск*', 'chelyabinsk'],
+    'Омск': ['омск*', 'omsk'],
+    'Уфа': ['уфа', 'уфы', 'уфе', 'уфу', 'уфой', 'уфимск*', 'ufa'],
+    'Пермь': ['пермь', 'перми', 'пермью', 'пермск*', 'perm'],
+    'Воронеж': ['воронеж*', 'voronezh'],
+    'Волгоград': ['волгоград*', 'volgograd'],
+    'Сочи': ['сочи', 'sochi'],
+    'Владивосток': ['владивосток*', 'vladivostok'],
+    'Харьков': ['харьков*', 'харків*', 'kharkiv', 'kharkov'],
+    'Одесса': ['одесс*', 'одеса', 'одеси', 'одесі', 'одеськ*', 'odessa', 'odesa'],
+    'Днепр': ['днепр*', 'дніпр*', 'dnipro', 'dnepr'],
+    'Львов': ['львов', 'львова', 'львову', 'львове', 'львовом', 'львовск*', 'львів*', 'lviv', 'lvov'],
+    'Алматы': ['алматы', 'алма-ат*', 'almaty'],
+    'Астана': ['астана', 'астаны', 'астане', 'астану', 'астаной', 'astana'],
+    'Ташкент': ['ташкент*', 'tashkent'],
+    'Россия': ['россия', 'россии', 'россию', 'россией', 'российск*', 'россиян*', 'рф', 'russia', 'rossiya'],
+    'Украина': ['украин*', 'україн*', 'ukraine', 'ukraina'],
+    'Беларусь': ['беларус*', 'белорус*', 'belarus'],
+    'Казахстан': ['казахстан*', 'kazakhstan'],
+    'Узбекистан': ['узбекистан*', 'uzbekistan'],
+}
@@ -1,12 +1,192 @@
 import sqlite3
 import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 
+import aiosqlite
+
+from config import (
+    DB_POOL_SIZE, DB_BUSY_TIMEOUT, DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY,
+    QUEUE_AGING_SECONDS, QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_BASE_DELAY, QUEUE_WAIT_SAMPLE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = 'groups.db'
+
+# Тексты запросов вынесены в константы: одна и та же строка SQL берется
+# из кэша подготовленных выражений соединения и не компилируется заново
+SQL_ADD_TO_QUEUE = '''INSERT INTO check_queue (group_id, group_title, user_id, invite_link, priority, enqueued_at)
+        VALUES (?, ?, ?, ?, ?, ?)'''
+SQL_UPDATE_QUEUE_STATUS = 'UPDATE check_queue SET status = ? WHERE id = ?'
+SQL_GET_PENDING_CHECKS = "SELECT * FROM check_queue WHERE status = 'pending' ORDER BY created_at"
+# Захват проверки одним UPDATE: строка атомарно переходит из pending в processing,
+# поэтому два воркера никогда не получат одну и ту же группу. В той же строке
+# запоминаем аккаунт UserBot, которому досталась проверка.
+#
+# Порядок выдачи - по эффективному приоритету:
+#   priority (проверки администратора выше остальных)
+#   + 1 за каждые QUEUE_AGING_SECONDS ожидания (старение: очередь не голодает)
+#   - номер проверки среди незавершенных проверок того же пользователя
+# При равном приоритете первым обслуживается пользователь, который дольше всех
+# не получал проверку. Вместе с вычетом за номер это дает честную очередь:
+# 30 групп одного пользователя чередуются с группами остальных
+SQL_CLAIM_NEXT_CHECK = '''UPDATE check_queue SET status = 'processing', account = :account, claimed_at = :now
+        WHERE id = (
+            SELECT id FROM (
+                SELECT id, status, priority, enqueued_at, next_attempt_at,
+                    (SELECT MAX(served.claimed_at) FROM check_queue AS served
+                        WHERE served.user_id = check_queue.user_id) AS last_served_at,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY user_id
+                        ORDER BY status = 'processing' DESC, priority DESC, enqueued_at, id
+                    ) AS user_rank
+                FROM check_queue WHERE status IN ('pending', 'processing')
+            )
+            WHERE status = 'pending' AND next_attempt_at <= :now
+            ORDER BY priority + CAST((:now - enqueued_at) / :aging AS INTEGER) - user_rank DESC,
+                last_served_at, enqueued_at, id
+            LIMIT 1
+        )
+        RETURNING id, group_id, group_title, user_id, invite_link, status, created_at'''
+SQL_REQUEUE_STALE_CHECKS = "UPDATE check_queue SET status = 'pending' WHERE status = 'processing'"
+# Повтор с экспоненциальной паузой: QUEUE_RETRY_BASE_DELAY, x2, x4...
+# после QUEUE_MAX_ATTEMPTS попыток проверка считается неудачной
+SQL_RETRY_CHECK = '''UPDATE check_queue SET
+            attempts = attempts + 1,
+            status = CASE WHEN attempts + 1 < :max_attempts THEN 'pending' ELSE 'failed' END,
+            next_attempt_at = :now + :base_delay * (1 << attempts)
+        WHERE id = :id
+        RETURNING status, attempts, next_attempt_at'''
+# Ожидание в очереди отсчитывается от постановки (или от времени повторной попытки)
+SQL_GET_QUEUE_WAITS = '''SELECT claimed_at - MAX(enqueued_at, next_attempt_at) FROM check_queue
+        WHERE claimed_at IS NOT NULL AND enqueued_at IS NOT NULL
+        ORDER BY claimed_at DESC LIMIT ?'''
+SQL_COUNT_PENDING_CHECKS = "SELECT COUNT(*) FROM check_queue WHERE status = 'pending'"
+# Одна строка результата на одну проверку из очереди: UserBot и основной бот
+# дописывают свои части в одну и ту же строку по queue_id
+SQL_SAVE_CHECK_RESULT = '''INSERT INTO group_checks
+        (queue_id, group_id, group_title, user_id, bot_check_result, userbot_check_result, final_result, issues)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(queue_id) DO UPDATE SET
+            group_title = excluded.group_title,
+            bot_check_result = excluded.bot_check_result,
+            userbot_check_result = excluded.userbot_check_result,
+            final_result = excluded.final_result,
+            issues = excluded.issues'''
+SQL_GET_USERBOT_RESULT = '''SELECT userbot_check_result FROM group_checks
+        WHERE group_id = ? AND userbot_check_result IS NOT NULL
+        ORDER BY created_at DESC, id DESC LIMIT 1'''
+SQL_ADD_TO_LEAVE_QUEUE = 'INSERT INTO leave_queue (group_id, reason) VALUES (?, ?)'
+# Периодическая уборка не дублирует группы, которые уже ждут выхода
+SQL_ADD_TO_LEAVE_QUEUE_ONCE = '''INSERT INTO leave_queue (group_id, reason)
+        SELECT ?, ? WHERE NOT EXISTS (
+            SELECT 1 FROM leave_queue WHERE group_id = ? AND status IN ('pending', 'processing')
+        )'''
+# Пачка выходов: группы, которые еще проверяются, остаются в очереди до конца проверки
+SQL_CLAIM_LEAVE_BATCH = '''UPDATE leave_queue SET status = 'processing'
+        WHERE id IN (
+            SELECT id FROM leave_queue
+            WHERE status = 'pending' AND group_id NOT IN (
+                SELECT group_id FROM check_queue WHERE status IN ('pending', 'processing')
+            )
+            ORDER BY created_at, id LIMIT ?
+        )
+        RETURNING id, group_id, reason'''
+SQL_UPDATE_LEAVE_STATUS = 'UPDATE leave_queue SET status = ? WHERE id = ?'
+SQL_REQUEUE_STALE_LEAVES = "UPDATE leave_queue SET status = 'pending' WHERE status = 'processing'"
+# Группы, в которые вступали ради проверки и проверка которых завершена
+SQL_GET_FINISHED_CHECK_GROUPS = '''SELECT group_id FROM check_queue GROUP BY group_id
+        HAVING SUM(status IN ('pending', 'processing')) = 0'''
+SQL_ADD_MEMBERSHIP = '''INSERT INTO userbot_memberships (account, group_id, joined_at) VALUES (?, ?, ?)
+        ON CONFLICT(account, group_id) DO NOTHING'''
+SQL_REMOVE_MEMBERSHIP = 'DELETE FROM userbot_memberships WHERE account = ? AND group_id = ?'
+SQL_GET_GROUP_MEMBERS = 'SELECT account FROM userbot_memberships WHERE group_id = ?'
+SQL_GET_ACCOUNT_MEMBERSHIPS = 'SELECT group_id FROM userbot_memberships WHERE account = ?'
+SQL_GET_CACHED_ENTITY = '''SELECT peer_type, peer_id, access_hash, updated_at FROM entity_cache
+        WHERE account = ? AND group_id = ?'''
+SQL_GET_CACHED_GROUP_BY_INVITE = '''SELECT group_id FROM entity_cache
+        WHERE account = ? AND invite_hash = ? AND updated_at > ?'''
+SQL_DELETE_EXPIRED_ENTITIES = 'DELETE FROM entity_cache WHERE updated_at <= ?'
+SQL_SAVE_CACHED_ENTITY = '''INSERT INTO entity_cache
+        (account, group_id, invite_hash, peer_type, peer_id, access_hash, title, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(account, group_id) DO UPDATE SET
+            invite_hash = COALESCE(excluded.invite_hash, invite_hash),
+            peer_type = excluded.peer_type,
+            peer_id = excluded.peer_id,
+            access_hash = excluded.access_hash,
+            title = excluded.title,
+            updated_at = excluded.updated_at'''
+
+# Миграции схемы: (версия, список SQL). Номер последней примененной миграции
+# хранится в PRAGMA user_version, новые миграции добавляются только в конец
+SCHEMA_MIGRATIONS = [
+    (1, [
+        # Выборка очереди и поиск результатов по группе без полного перебора таблиц
+        'CREATE INDEX IF NOT EXISTS idx_check_queue_status_created ON check_queue (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_group_checks_group_created ON group_checks (group_id, created_at)',
+    ]),
+    (2, [
+        # Старые строки остаются с queue_id = NULL, уникальность на них не распространяется
+        'ALTER TABLE group_checks ADD COLUMN queue_id INTEGER',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_group_checks_queue ON group_checks (queue_id)',
+    ]),
+    (3, [
+        # Кэш сущностей групп UserBot: access_hash позволяет обращаться к группе без get_entity
+        '''CREATE TABLE IF NOT EXISTS entity_cache (
+            account TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            invite_hash TEXT,
+            peer_type TEXT NOT NULL,
+            peer_id INTEGER NOT NULL,
+            access_hash INTEGER,
+            title TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (account, group_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_entity_cache_invite ON entity_cache (account, invite_hash)',
+    ]),
+    (4, [
+        # Аккаунт пула UserBot, который обрабатывает (или обработал) проверку
+        'ALTER TABLE check_queue ADD COLUMN account TEXT',
+    ]),
+    (5, [
+        # Планировщик очереди: приоритет, повторные попытки и время ожидания
+        'ALTER TABLE check_queue ADD COLUMN priority INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE check_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE check_queue ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE check_queue ADD COLUMN enqueued_at REAL',
+        'ALTER TABLE check_queue ADD COLUMN claimed_at REAL',
+        "UPDATE check_queue SET enqueued_at = CAST(strftime('%s', created_at) AS REAL)",
+        'CREATE INDEX IF NOT EXISTS idx_check_queue_user_claimed ON check_queue (user_id, claimed_at)',
+    ]),
+    (6, [
+        # Группы, в которых сейчас состоят аккаунты UserBot: по ним работает очередь выхода
+        '''CREATE TABLE IF NOT EXISTS userbot_memberships (
+            account TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            joined_at REAL NOT NULL,
+            PRIMARY KEY (account, group_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_userbot_memberships_group ON userbot_memberships (group_id)',
+        'CREATE INDEX IF NOT EXISTS idx_leave_queue_status_created ON leave_queue (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_check_queue_group_status ON check_queue (group_id, status)',
+    ]),
+]
+
 def init_db():
     """Инициализация базы данных"""
-    conn = sqlite3.connect('groups.db')
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT)
     cursor = conn.cursor()
-    
+
+    # WAL хранится в самом файле базы: читатели больше не блокируют писателя,
+    # и процессы основного бота и UserBot могут работать с базой одновременно
+    cursor.execute('PRAGMA journal_mode=WAL')
+
     # Таблица очереди проверок
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS check_queue (
@@ -19,7 +199,7 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
+
     # Таблица результатов проверок
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS group_checks (
@@ -34,7 +214,7 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
+
     # Таблица для очереди на выход
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS leave_queue (
@@ -45,98 +225,392 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
+
     conn.commit()
+
+    migrate_db(conn)
+
     conn.close()
     print("✅ База данных инициализирована")
 
-def add_to_queue(group_id, group_title, user_id, invite_link):
+def migrate_db(conn):
+    """Применяем к базе все миграции схемы новее ее текущей версии"""
+    # BEGIN IMMEDIATE сразу берет блокировку на запись, поэтому два процесса
+    # не смогут применить одну и ту же миграцию одновременно
+    conn.isolation_level = None
+    try:
+        for version, statements in SCHEMA_MIGRATIONS:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if current_version >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+                print(f"✅ Применена миграция схемы БД №{version}")
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.isolation_level = ''
+
+class ConnectionPool:
+    """Пул долгоживущих асинхронных соединений с базой (один на процесс)"""
+
+    def __init__(self, db_file, size):
+        self.db_file = db_file
+        self.size = size
+        self._connections = []
+        self._idle = None
+        self._lock = None
+
+    async def _open_connection(self):
+        """Открываем соединение с увеличенным кэшем подготовленных выражений"""
+        conn = await aiosqlite.connect(self.db_file, timeout=DB_BUSY_TIMEOUT, cached_statements=256)
+        # Настройки соединения: ждем блокировку другого процесса вместо ошибки
+        # "database is locked", в режиме WAL достаточно synchronous=NORMAL
+        await conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}')
+        await conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    async def _ensure_open(self):
+        """Лениво открываем соединения внутри работающего event loop"""
+        if self._idle is not None:
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._idle is not None:
+                return
+
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await self._open_connection()
+                self._connections.append(conn)
+                idle.put_nowait(conn)
+
+            self._idle = idle
+            logger.info(f"🗄 Открыт пул соединений с БД ({self.size} шт.)")
+
+    @asynccontextmanager
+    async def connection(self):
+        """Берем соединение из пула на время одной операции"""
+        await self._ensure_open()
+        conn = await self._idle.get()
+        failed = True
+        try:
+            yield conn
+            failed = False
+        finally:
+            try:
+                # Отмена задачи (CancelledError) - не Exception: откатываем в finally,
+                # иначе соединение вернется в пул с открытой транзакцией и заблокирует запись
+                if failed or conn.in_transaction:
+                    await conn.rollback()
+            finally:
+                self._idle.put_nowait(conn)
+
+    async def close(self):
+        """Закрываем все соединения пула (потоки aiosqlite не являются daemon)"""
+        for conn in self._connections:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Не удалось закрыть соединение с БД: {e}")
+
+        self._connections = []
+        self._idle = None
+        self._lock = None
+
+class WriteBatcher:
+    """Объединяет мелкие записи в общие транзакции; вызывающий код ждет фиксации своей записи"""
+
+    def __init__(self, pool, max_batch, max_delay):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self._flush_tasks = set()
+        self._flush_lock = None
+        self.batches = 0
+        self.writes = 0
+
+    async def submit(self, sql, params):
+        """Ставим запись в пакет и ждем фиксации транзакции"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((sql, params, future))
+
+        if len(self._pending) >= self.max_batch:
+            task = asyncio.create_task(self.flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Фиксируем все накопленные записи одной транзакцией"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+
+            try:
+                async with self.pool.connection() as conn:
+                    results = []
+                    for sql, params, _ in batch:
+                        async with conn.execute(sql, params) as cursor:
+                            results.append(cursor.lastrowid)
+                    await conn.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Пакетная запись не удалась ({e}), записываю по одной")
+                await self._write_one_by_one(batch)
+                return
+
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, _, future), lastrowid in zip(batch, results):
+                if not future.done():
+                    future.set_result(lastrowid)
+
+    async def _write_one_by_one(self, batch):
+        """Запасной путь: одна ошибочная запись не должна отменять остальные"""
+        for sql, params, future in batch:
+            try:
+                async with self.pool.connection() as conn:
+                    async with conn.execute(sql, params) as cursor:
+                        lastrowid = cursor.lastrowid
+                    await conn.commit()
+                if not future.done():
+                    future.set_result(lastrowid)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+# Глобальный пул соединений процесса
+db_pool = ConnectionPool(DB_FILE, DB_POOL_SIZE)
+write_batcher = WriteBatcher(db_pool, DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY)
+
+async def close_db():
+    """Закрываем пул соединений при остановке процесса"""
+    await write_batcher.flush()
+    await db_pool.close()
+
+async def add_to_queue(group_id, group_title, user_id, invite_link, priority=0):
     """Добавляем группу в очередь на проверку"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO check_queue (group_id, group_title, user_id, invite_link) VALUES (?, ?, ?, ?)',
-        (group_id, group_title, user_id, invite_link)
-    )
-    queue_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_ADD_TO_QUEUE, (group_id, group_title, user_id, invite_link, priority, time.time())) as cursor:
+            queue_id = cursor.lastrowid
+        await conn.commit()
     print(f"✅ Группа {group_title} добавлена в очередь (ID: {queue_id})")
     return queue_id
 
-def update_queue_status(queue_id, status):
+async def update_queue_status(queue_id, status):
     """Обновляем статус в очереди"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        'UPDATE check_queue SET status = ? WHERE id = ?',
-        (status, queue_id)
-    )
-    conn.commit()
-    conn.close()
+    await write_batcher.submit(SQL_UPDATE_QUEUE_STATUS, (status, queue_id))
 
-def get_pending_checks():
+async def get_pending_checks():
     """Получаем ожидающие проверки"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM check_queue WHERE status = "pending"')
-    pending = cursor.fetchall()
-    conn.close()
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_PENDING_CHECKS) as cursor:
+            pending = await cursor.fetchall()
     return pending
 
-def save_check_result(group_id, group_title, user_id, bot_result, userbot_result, final_result, issues):
-    """Сохраняем результаты проверки"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO group_checks 
-        (group_id, group_title, user_id, bot_check_result, userbot_check_result, final_result, issues) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)''',
-        (group_id, group_title, user_id, json.dumps(bot_result), json.dumps(userbot_result), final_result, issues)
+async def claim_next_check(account=None):
+    """Забираем следующую проверку из очереди для аккаунта UserBot (None, если очередь пуста)"""
+    async with db_pool.connection() as conn:
+        params = {'account': account, 'now': time.time(), 'aging': QUEUE_AGING_SECONDS}
+        async with conn.execute(SQL_CLAIM_NEXT_CHECK, params) as cursor:
+            check = await cursor.fetchone()
+        await conn.commit()
+    return check
+
+async def requeue_stale_checks():
+    """Возвращаем в очередь проверки, брошенные упавшим процессом UserBot"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_REQUEUE_STALE_CHECKS) as cursor:
+            count = cursor.rowcount
+        await conn.commit()
+    return count
+
+async def retry_check(queue_id):
+    """Откладываем неудавшуюся проверку на повтор; возвращаем новый статус, попытку и время повтора"""
+    params = {
+        'id': queue_id,
+        'now': time.time(),
+        'max_attempts': QUEUE_MAX_ATTEMPTS,
+        'base_delay': QUEUE_RETRY_BASE_DELAY
+    }
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_RETRY_CHECK, params) as cursor:
+            row = await cursor.fetchone()
+        await conn.commit()
+    return row
+
+def percentile(values, p):
+    """Перцентиль p (0-100) по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+async def get_queue_wait_stats():
+    """Длина очереди и время ожидания p50/p95 по последним проверкам (сек)"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_COUNT_PENDING_CHECKS) as cursor:
+            pending = (await cursor.fetchone())[0]
+        async with conn.execute(SQL_GET_QUEUE_WAITS, (QUEUE_WAIT_SAMPLE_SIZE,)) as cursor:
+            waits = [row[0] for row in await cursor.fetchall() if row[0] is not None]
+
+    return {
+        'pending': pending,
+        'samples': len(waits),
+        'p50': percentile(waits, 50),
+        'p95': percentile(waits, 95)
+    }
+
+def format_queue_wait_stats(stats):
+    """Строка со временем ожидания в очереди для логов и команды /queue"""
+    if not stats['samples']:
+        return f"в очереди {stats['pending']}, данных об ожидании нет"
+    return (
+        f"в очереди {stats['pending']}, ожидание p50 {stats['p50']:.1f} сек, "
+        f"p95 {stats['p95']:.1f} сек (по {stats['samples']} проверкам)"
+    )
+
+async def save_check_result(group_id, group_title, user_id, bot_result, userbot_result, final_result, issues, queue_id=None):
+    """Сохраняем результаты проверки (повторное сохранение с тем же queue_id обновляет строку)"""
+    await write_batcher.submit(
+        SQL_SAVE_CHECK_RESULT,
+        (queue_id, group_id, group_title, user_id, json.dumps(bot_result), json.dumps(userbot_result), final_result, issues)
     )
-    conn.commit()
-    conn.close()
     print(f"✅ Результаты проверки для {group_title} сохранены")
 
-def get_userbot_result(group_id):
+async def get_userbot_result(group_id):
     """Получаем результаты UserBot для группы"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT userbot_check_result FROM group_checks WHERE group_id = ?',
-        (group_id,)
-    )
-    result = cursor.fetchone()
-    conn.close()
-    
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_USERBOT_RESULT, (group_id,)) as cursor:
+            result = await cursor.fetchone()
+
     if result and result[0]:
         return json.loads(result[0])
     return None
 
-def is_check_complete(group_id):
+async def is_check_complete(group_id):
     """Проверяем, завершена ли проверка группы"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT userbot_check_result FROM group_checks WHERE group_id = ?',
-        (group_id,)
-    )
-    result = cursor.fetchone()
-    conn.close()
-    
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_USERBOT_RESULT, (group_id,)) as cursor:
+            result = await cursor.fetchone()
+
     return result is not None and result[0] is not None
 
-def add_to_leave_queue(group_id, reason="manual"):
+async def add_to_leave_queue(group_id, reason="manual"):
     """Добавляем группу в очередь на выход"""
-    conn = sqlite3.connect('groups.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT INTO leave_queue (group_id, reason) VALUES (?, ?)',
-        (group_id, reason)
-    )
-    queue_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_ADD_TO_LEAVE_QUEUE, (group_id, reason)) as cursor:
+            queue_id = cursor.lastrowid
+        await conn.commit()
     print(f"✅ Группа {group_id} добавлена в очередь на выход (ID: {queue_id})")
     return queue_id
+
+async def add_to_leave_queue_once(group_id, reason):
+    """Добавляем группу в очередь на выход, если она еще не ждет выхода (True - добавлена)"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_ADD_TO_LEAVE_QUEUE_ONCE, (group_id, reason, group_id)) as cursor:
+            added = cursor.rowcount > 0
+        await conn.commit()
+    return added
+
+async def claim_leave_batch(limit):
+    """Забираем пачку выходов из очереди"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_CLAIM_LEAVE_BATCH, (limit,)) as cursor:
+            batch = await cursor.fetchall()
+        await conn.commit()
+    return batch
+
+async def update_leave_status(leave_id, status):
+    """Обновляем статус в очереди на выход"""
+    await write_batcher.submit(SQL_UPDATE_LEAVE_STATUS, (status, leave_id))
+
+async def requeue_stale_leaves():
+    """Возвращаем в очередь выходы, брошенные упавшим процессом UserBot"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_REQUEUE_STALE_LEAVES) as cursor:
+            count = cursor.rowcount
+        await conn.commit()
+    return count
+
+async def get_finished_check_groups():
+    """ID групп, проверка которых завершена"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_FINISHED_CHECK_GROUPS) as cursor:
+            rows = await cursor.fetchall()
+    return {row[0] for row in rows}
+
+async def add_membership(account, group_id):
+    """Запоминаем, что аккаунт UserBot вступил в группу"""
+    await write_batcher.submit(SQL_ADD_MEMBERSHIP, (account, group_id, time.time()))
+
+async def remove_membership(account, group_id):
+    """Запоминаем, что аккаунт UserBot вышел из группы"""
+    await write_batcher.submit(SQL_REMOVE_MEMBERSHIP, (account, group_id))
+
+async def get_group_members(group_id):
+    """Аккаунты UserBot, которые состоят в группе"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_GROUP_MEMBERS, (group_id,)) as cursor:
+            rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+async def get_account_memberships(account):
+    """Группы, в которых состоит аккаунт UserBot"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_ACCOUNT_MEMBERSHIPS, (account,)) as cursor:
+            rows = await cursor.fetchall()
+    return {row[0] for row in rows}
+
+async def get_cached_entity(account, group_id):
+    """Сохраненные данные сущности группы для аккаунта UserBot"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_CACHED_ENTITY, (account, group_id)) as cursor:
+            return await cursor.fetchone()
+
+async def get_cached_group_by_invite(account, invite_hash, ttl):
+    """ID группы, в которую аккаунт вступал по приглашению не раньше ttl секунд назад"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_GET_CACHED_GROUP_BY_INVITE, (account, invite_hash, time.time() - ttl)) as cursor:
+            row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def save_cached_entity(account, group_id, invite_hash, peer_type, peer_id, access_hash, title):
+    """Сохраняем (или обновляем) сущность группы в кэше"""
+    await write_batcher.submit(
+        SQL_SAVE_CACHED_ENTITY,
+        (account, group_id, invite_hash, peer_type, peer_id, access_hash, title, time.time())
+    )
+
+async def prune_entity_cache(ttl):
+    """Удаляем из кэша сущностей записи старше ttl секунд"""
+    async with db_pool.connection() as conn:
+        async with conn.execute(SQL_DELETE_EXPIRED_ENTITIES, (time.time() - ttl,)) as cursor:
+            count = cursor.rowcount
+        await conn.commit()
+    return count
@@ -0,0 +1,105 @@
+import time
+import logging
+from collections import OrderedDict
+from telethon import utils
+from telethon.tl.types import Channel, Chat, InputPeerChannel, InputPeerChat
+from database import get_cached_entity, get_cached_group_by_invite, save_cached_entity
+
+logger = logging.getLogger(__name__)
+
+class EntityCache:
+    """LRU-кэш сущностей групп с TTL, сохраняемый в groups.db отдельно для каждого аккаунта"""
+
+    def __init__(self, account, max_size, ttl):
+        self.account = account
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._invites = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, group_id, entity):
+        self._entries[group_id] = (entity, time.time() + self.ttl)
+        self._entries.move_to_end(group_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _remember_invite(self, invite_hash, group_id):
+        self._invites[invite_hash] = (group_id, time.time() + self.ttl)
+        self._invites.move_to_end(invite_hash)
+        while len(self._invites) > self.max_size:
+            self._invites.popitem(last=False)
+
+    async def get(self, group_id):
+        """Сущность группы: полный объект, InputPeer из базы или None"""
+        entry = self._entries.get(group_id)
+        if entry is not None:
+            entity, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(group_id)
+                self.memory_hits += 1
+                return entity
+            del self._entries[group_id]
+
+        row = await get_cached_entity(self.account, group_id)
+        if row is not None:
+            peer_type, peer_id, access_hash, updated_at = row
+            if updated_at + self.ttl > time.time():
+                if peer_type == 'channel':
+                    entity = InputPeerChannel(peer_id, access_hash)
+                else:
+                    entity = InputPeerChat(peer_id)
+                self._remember(group_id, entity)
+                self.db_hits += 1
+                return entity
+
+        self.misses += 1
+        return None
+
+    async def get_group_id_by_invite(self, invite_hash):
+        """ID группы, в которую уже вступали по этому приглашению"""
+        entry = self._invites.get(invite_hash)
+        if entry is not None:
+            group_id, expires_at = entry
+            if expires_at > time.time():
+                self._invites.move_to_end(invite_hash)
+                self.memory_hits += 1
+                return group_id
+            del self._invites[invite_hash]
+
+        group_id = await get_cached_group_by_invite(self.account, invite_hash, self.ttl)
+        if group_id is not None:
+            self._remember_invite(invite_hash, group_id)
+            self.db_hits += 1
+            return group_id
+
+        self.misses += 1
+        return None
+
+    async def put(self, entity, invite_hash=None):
+        """Запоминаем полную сущность группы (и приглашение, по которому в нее вступили)"""
+        if not isinstance(entity, (Channel, Chat)):
+            return None
+
+        group_id = utils.get_peer_id(entity)
+        self._remember(group_id, entity)
+        if invite_hash:
+            self._remember_invite(invite_hash, group_id)
+
+        peer_type = 'channel' if isinstance(entity, Channel) else 'chat'
+        await save_cached_entity(
+            self.account, group_id, invite_hash, peer_type, entity.id,
+            getattr(entity, 'access_hash', None), getattr(entity, 'title', None)
+        )
+        return group_id
+
+    def summary(self):
+        """Краткая сводка счетчиков для логов"""
+        total = self.memory_hits + self.db_hits + self.misses
+        hit_rate = (self.memory_hits + self.db_hits) / total * 100 if total else 0
+        return (
+            f"{self.memory_hits} попаданий в памяти, {self.db_hits} из БД, "
+            f"{self.misses} промахов ({hit_rate:.0f}% попаданий), {len(self._entries)} записей"
+        )
@@ -0,0 +1,67 @@
+import re
+from config import GEO_ALIASES
+
+# Граница слова - соседний символ не буква (цифры и "_" словом не считаются: "msk_chat", "спб24")
+LETTER = r'[^\W\d_]'
+STEM_MARK = '*'
+
+def normalize(text):
+    """Приводим текст к виду, в котором хранится словарь: нижний регистр, ё -> е"""
+    return text.lower().replace('ё', 'е')
+
+class GeoMatcher:
+    """Поиск гео-признаков за один проход: регулярное выражение из префиксного дерева вариантов"""
+
+    def __init__(self, aliases):
+        self._exact = {}
+        self._stems = {}
+        trie = {}
+        for canonical, variants in aliases.items():
+            for variant in variants:
+                variant = normalize(variant)
+                is_stem = variant.endswith(STEM_MARK)
+                word = variant.rstrip(STEM_MARK)
+                (self._stems if is_stem else self._exact)[word] = canonical
+
+                node = trie
+                for char in word:
+                    node = node.setdefault(char, {})
+                node[STEM_MARK if is_stem else ''] = True
+
+        self.pattern = re.compile(f"(?<!{LETTER})(?:{self._node_pattern(trie)})(?!{LETTER})")
+
+    def _node_pattern(self, node):
+        """Выражение для поддерева: сначала более длинные продолжения, потом окончание слова"""
+        branches = [
+            re.escape(char) + self._node_pattern(child)
+            for char, child in sorted(node.items()) if char not in ('', STEM_MARK)
+        ]
+        if STEM_MARK in node:
+            branches.append(f"{LETTER}*")
+        if '' in node:
+            branches.append('')
+        if len(branches) == 1:
+            return branches[0]
+        return f"(?:{'|'.join(branches)})"
+
+    def _canonical(self, word):
+        if word in self._exact:
+            return self._exact[word]
+        # Самая длинная основа, с которой начинается найденное слово
+        for end in range(len(word), 0, -1):
+            canonical = self._stems.get(word[:end])
+            if canonical is not None:
+                return canonical
+        return None
+
+    def find(self, text):
+        """Канонические названия найденных гео-признаков в порядке появления, без повторов"""
+        found = []
+        for match in self.pattern.finditer(normalize(text or '')):
+            canonical = self._canonical(match.group())
+            if canonical is not None and canonical not in found:
+                found.append(canonical)
+        return found
+
+# Общий словарь гео-признаков для основного бота и UserBot
+geo_matcher = GeoMatcher(GEO_ALIASES)
@@ -1,9 +1,8 @@
 import asyncio
 import logging
-import multiprocessing
-import time
 import sys
 import os
+import secrets
 from datetime import datetime
 
 # Добавляем текущую директорию в путь для импортов
@@ -20,26 +19,69 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_main_bot():
+# Флаг запуска основного бота и UserBot в одном процессе и одном цикле событий
+SINGLE_PROCESS_FLAG = "--single-process"
+
+def run_main_bot(heartbeat_conn=None):
     """Запуск основного бота в отдельном процессе"""
     try:
         from main_bot import main as main_bot_main
+        from supervisor import Heartbeat
         print("🚀 Запускаю основного бота...")
-        main_bot_main()
+        main_bot_main(Heartbeat(heartbeat_conn) if heartbeat_conn else None)
     except Exception as e:
         logger.error(f"❌ Ошибка запуска основного бота: {e}")
         print(f"❌ Ошибка основного бота: {e}")
 
-def run_userbot():
+def run_userbot(heartbeat_conn=None):
     """Запуск UserBot в отдельном процессе"""
     try:
         from userbot import main_userbot
+        from supervisor import Heartbeat
         print("🚀 Запускаю UserBot...")
-        asyncio.run(main_userbot())
+        asyncio.run(main_userbot(Heartbeat(heartbeat_conn) if heartbeat_conn else None))
     except Exception as e:
         logger.error(f"❌ Ошибка запуска UserBot: {e}")
         print(f"❌ Ошибка UserBot: {e}")
 
+async def run_single_process(heartbeat=None):
+    """Основной бот и UserBot в одном цикле событий: результаты передаются через память"""
+    from sync_manager import use_in_process_channel
+    from main_bot import build_application, run_bot_in_loop, stop_bot_in_loop
+    from userbot import start_accounts, stop_accounts, process_pending_checks
+    
+    if heartbeat is not None:
+        heartbeat.start()
+    
+    use_in_process_channel()
+    
+    application = build_application()
+    await run_bot_in_loop(application)
+    print("✅ Основной бот запущен")
+    
+    try:
+        if await start_accounts():
+            print("✅ UserBot запущен")
+            await process_pending_checks()
+        else:
+            # Основной бот продолжает принимать группы, проверки ждут в очереди
+            logger.error("❌ UserBot не запущен, работает только основной бот")
+            await asyncio.Event().wait()
+    finally:
+        await stop_accounts()
+        # post_shutdown основного бота закрывает и пул соединений с БД
+        await stop_bot_in_loop(application)
+
+def run_single(heartbeat_conn=None):
+    """Запуск основного бота и UserBot в одном дочернем процессе"""
+    try:
+        from supervisor import Heartbeat
+        print("🚀 Запускаю основного бота и UserBot в одном процессе...")
+        asyncio.run(run_single_process(Heartbeat(heartbeat_conn) if heartbeat_conn else None))
+    except Exception as e:
+        logger.error(f"❌ Ошибка запуска системы в одном процессе: {e}")
+        print(f"❌ Ошибка: {e}")
+
 def check_dependencies():
     """Проверка наличия всех необходимых зависимостей"""
     required_modules = [
@@ -104,13 +146,22 @@ def check_config():
         print(f"❌ Ошибка проверки конфигурации: {e}")
         return False
 
-def show_status():
+def check_sessions():
+    """Проверка, что сессии UserBot авторизованы заранее (под супервизором ввод кода невозможен)"""
+    from config import USERBOT_SESSION_FILES
+    
+    missing = [session for session in USERBOT_SESSION_FILES if not os.path.exists(f"{session}.session")]
+    for session in missing:
+        print(f"⚠️ Сессия {session} не найдена. Авторизуйте ее один раз: python userbot.py --login {session}")
+    return not missing
+
+def show_status(single_process=False):
     """Показать статус системы"""
     print("\n" + "="*50)
     print("🤖 СИСТЕМА БОТА-ОЦЕНЩИКА ГРУПП")
     print("="*50)
     print(f"📅 Дата запуска: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("👥 Запуск в режиме:")
+    print(f"👥 Запуск в режиме ({'один процесс' if single_process else 'два процесса'}):")
     print("   • Основной бот (Telegram Bot API)")
     print("   • UserBot (Telethon)")
     print("\n⚙️  Функциональность:")
@@ -124,9 +175,10 @@ def show_status():
 
 def main():
     """Основная функция запуска"""
+    single_process = SINGLE_PROCESS_FLAG in sys.argv[1:]
     
     # Показываем статус системы
-    show_status()
+    show_status(single_process)
     
     # Проверяем зависимости
     print("\n🔍 Проверяю зависимости...")
@@ -144,6 +196,9 @@ def main():
         sys.exit(1)
     print("✅ Конфигурация корректна")
     
+    if check_sessions():
+        print("✅ Сессии UserBot найдены")
+    
     # Инициализируем базу данных
     try:
         from database import init_db
@@ -154,74 +209,40 @@ def main():
         print("❌ Ошибка базы данных")
         sys.exit(1)
     
+    # Секрет локального канала результатов UserBot -> основной бот,
+    # дочерние процессы получают его через переменные окружения
+    from sync_manager import RESULT_CHANNEL_TOKEN_ENV
+    os.environ[RESULT_CHANNEL_TOKEN_ENV] = secrets.token_hex(16)
+    
     print("\n🎯 Запускаю систему...")
     print("💡 Для остановки нажмите Ctrl+C")
     
-    # Создаем процессы для ботов
-    processes = []
+    # Супервизор перезапускает упавшие и зависшие процессы с нарастающей паузой
+    from supervisor import Supervisor
+    supervisor = Supervisor()
+    if single_process:
+        supervisor.add("Система (один процесс)", run_single)
+    else:
+        supervisor.add("Основной бот", run_main_bot)
+        supervisor.add("UserBot", run_userbot)
     
     try:
-        # Запускаем основной бот
-        main_bot_process = multiprocessing.Process(target=run_main_bot)
-        main_bot_process.daemon = True
-        main_bot_process.start()
-        processes.append(main_bot_process)
-        print("✅ Основной бот запущен")
-        
-        # Ждем немного перед запуском UserBot
-        time.sleep(3)
-        
-        # Запускаем UserBot
-        userbot_process = multiprocessing.Process(target=run_userbot)
-        userbot_process.daemon = True
-        userbot_process.start()
-        processes.append(userbot_process)
-        print("✅ UserBot запущен")
-        
+        supervisor.tick()
         print("\n🎉 Система успешно запущена!")
         print("📱 Добавьте бота в группу для начала проверки")
         print("⏳ Ожидайте обработки очереди...")
         
-        # Бесконечный цикл для поддержания работы процессов
-        while True:
-            time.sleep(1)
-            
-            # Проверяем статус процессов
-            for i, process in enumerate(processes):
-                if not process.is_alive():
-                    if i == 0:
-                        print("❌ Основной бот остановился, перезапускаю...")
-                        new_process = multiprocessing.Process(target=run_main_bot)
-                        new_process.daemon = True
-                        new_process.start()
-                        processes[i] = new_process
-                    else:
-                        print("❌ UserBot остановился, перезапускаю...")
-                        new_process = multiprocessing.Process(target=run_userbot)
-                        new_process.daemon = True
-                        new_process.start()
-                        processes[i] = new_process
+        supervisor.run()
             
     except KeyboardInterrupt:
         print("\n\n🛑 Останавливаю систему...")
-        
-        # Останавливаем процессы
-        for process in processes:
-            if process.is_alive():
-                process.terminate()
-                process.join(timeout=5)
-        
+        supervisor.stop()
         print("👋 Система остановлена")
         
     except Exception as e:
         logger.error(f"❌ Критическая ошибка системы: {e}")
         print(f"❌ Критическая ошибка: {e}")
-        
-        # Останавливаем процессы
-        for process in processes:
-            if process.is_alive():
-                process.terminate()
-        
+        supervisor.stop()
         sys.exit(1)
 
 if __name__ == "__main__":
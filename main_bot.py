@@ -1,25 +1,37 @@
-import asyncio
 import logging
+import secrets
 import aiosqlite
 import time
 from telegram import (
     Update, 
     InlineKeyboardButton, 
     InlineKeyboardMarkup,
-    Bot,
-    ChatMemberAdministrator
+    Bot
 )
 from telegram.ext import (
     Application, 
     CommandHandler, 
     CallbackQueryHandler, 
+    ChatMemberHandler,
     MessageHandler, 
     filters, 
     ContextTypes
 )
-from config import BOT_TOKEN, ADMIN_ID, WEB_CHECK_MIN_DIFF, MAX_WAIT_TIME
-from database import init_db, add_to_queue, update_queue_status, save_check_result, get_userbot_result, is_check_complete
+from config import (
+    BOT_TOKEN, ADMIN_ID, WEB_CHECK_MIN_DIFF, MAX_WAIT_TIME, QUEUE_PRIORITY_ADMIN, ADMIN_WAIT_TIMEOUT,
+    BOT_CONCURRENT_UPDATES, BOT_WEBHOOK_URL, BOT_WEBHOOK_LISTEN, BOT_WEBHOOK_PORT,
+    BOT_WEBHOOK_PATH, BOT_WEBHOOK_SECRET
+)
+from database import (
+    init_db, add_to_queue, update_queue_status, save_check_result, get_userbot_result, is_check_complete, close_db,
+    get_queue_wait_stats, format_queue_wait_stats, add_to_leave_queue
+)
 from sync_manager import sync_manager
+from admin_watcher import admin_watcher
+from onboarding import onboarding
+from status_message import StatusMessage
+from send_queue import send_queue, PRIORITY_REPORT, PRIORITY_PROGRESS
+from geo_signals import geo_matcher
 
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -29,6 +41,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
 # база данных
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -77,69 +92,58 @@ async def otkat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         group_id = int(context.args[0])
         
-        await update.message.reply_text(f"🔄 Команда на выход из группы {group_id} принята. UserBot обработает запрос.")
+        leave_id = await add_to_leave_queue(group_id, "otkat")
+        await update.message.reply_text(f"🔄 Команда на выход из группы {group_id} принята (ID: {leave_id}). UserBot обработает запрос.")
         
     except ValueError:
         await update.message.reply_text("❌ Неверный формат ID группы. Пример: /otkat -1001234567890")
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
-async def check_bot_admin_rights(bot, chat_id, max_attempts=30):
-    """Цикл проверки прав бота в группе"""
-    for attempt in range(max_attempts):
-        try:
-            bot_member = await bot.get_chat_member(chat_id, bot.id)
-            
-            if isinstance(bot_member, ChatMemberAdministrator):
-                logger.info(f"✅ Бот получил права администратора в чате {chat_id}")
-                return True, bot_member
-            
-            logger.info(f"🕐 Попытка {attempt + 1}: Бот еще не администратор в чате {chat_id}")
-            await asyncio.sleep(2)
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка проверки прав в чате {chat_id}: {e}")
-            await asyncio.sleep(2)
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /queue: длина очереди и время ожидания проверки"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ Эта команда только для администратора!")
+        return
     
-    return False, None
-
-async def perform_web_check(bot, chat_id):
-    """Веб-проверка: разница между ID сообщений"""
     try:
-       
-        test_message = await bot.send_message(
-            chat_id=chat_id,
-            text="⚡ Проверка сообщений..."
+        stats = await get_queue_wait_stats()
+        await update.message.reply_text(
+            f"📊 Очередь проверок: {format_queue_wait_stats(stats)}\n\n"
+            f"🧩 Подключение групп: {onboarding.summary()}\n\n"
+            f"📤 Отправка сообщений: {send_queue.summary()}"
         )
-        latest_message_id = test_message.message_id
-        
-       
-        messages = []
-        try:
-           
-            for i in range(10):
-                try:
-                    
-                    message = await bot.get_messages(chat_id, offset=i, limit=1)
-                    if message:
-                        messages.extend(message)
-                except:
-                    break
-        except Exception as e:
-            logger.error(f"Ошибка получения истории сообщений: {e}")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
+async def check_bot_admin_rights(bot, chat_id, timeout=ADMIN_WAIT_TIMEOUT):
+    """Ожидание прав бота в группе по обновлениям my_chat_member"""
+    return await admin_watcher.wait_for_admin(bot, chat_id, timeout)
+
+async def perform_web_check(probe_message_id, userbot_result, chat_type):
+    """Веб-проверка по ID сообщений, уже известным боту и UserBot, без запросов к API"""
+    try:
+        oldest_message_id = userbot_result.get('oldest_message_id')
+        newest_message_id = userbot_result.get('newest_message_id')
         
-      
-        oldest_message_id = messages[-1].message_id if messages else 1
+        # В обычных группах нумерация сообщений у бота и у UserBot своя - берем только ID UserBot
+        if chat_type == 'supergroup':
+            candidates = [probe_message_id, newest_message_id]
+        else:
+            candidates = [newest_message_id]
+        candidates = [message_id for message_id in candidates if message_id]
+        
+        if not oldest_message_id or not candidates:
+            logger.warning(f"🌐 Веб-проверка: нет данных о сообщениях (oldest_id={oldest_message_id}, probe_id={probe_message_id})")
+            return {
+                'message_id_diff': 0,
+                'check_passed': False,
+                'min_required_diff': WEB_CHECK_MIN_DIFF,
+                'error': 'Нет данных UserBot о сообщениях группы'
+            }
         
-     
+        latest_message_id = max(candidates)
         message_id_diff = latest_message_id - oldest_message_id
-        
-        
-        try:
-            await bot.delete_message(chat_id=chat_id, message_id=latest_message_id)
-        except:
-            pass
-        
         check_passed = message_id_diff > WEB_CHECK_MIN_DIFF
         
         logger.info(f"🌐 Веб-проверка: latest_id={latest_message_id}, oldest_id={oldest_message_id}, diff={message_id_diff}, passed={check_passed}")
@@ -162,14 +166,7 @@ async def perform_web_check(bot, chat_id):
 
 async def check_geo_by_name(chat_title):
     """Проверка на гео-группу по названию (резервный метод)"""
-    geo_keywords = [
-        'город', 'city', 'москва', 'спб', 'киев', 'moscow', 'kiev', 'питер',
-        'санкт-петербург', 'минск', 'казахстан', 'украина', 'россия', 'russia',
-        'ukraine', 'беларусь', 'belarus', 'казань', 'новосибирск', 'екатеринбург'
-    ]
-    
-    title_lower = chat_title.lower()
-    found_keywords = [kw for kw in geo_keywords if kw in title_lower]
+    found_keywords = geo_matcher.find(chat_title)
     is_geo = len(found_keywords) > 0
     
     return {
@@ -220,112 +217,120 @@ async def handle_bot_added_to_group(update: Update, context: ContextTypes.DEFAUL
                     "⏳ Ожидайте начала полной проверки."
                 )
                 
-                await message.reply_text(welcome_text)
+                # Приветствие становится статусным сообщением проверки
+                status = StatusMessage(context.bot, chat.id)
+                status.attach(await send_queue.send_message(
+                    context.bot, chat.id, welcome_text, PRIORITY_PROGRESS,
+                    reply_to_message_id=message.message_id
+                ))
                 
-                
-                asyncio.create_task(
-                    full_group_analysis(context.bot, chat, user.id)
-                )
+                # Конвейер хранит ссылку на задачу и отменит ее при остановке бота
+                onboarding.submit(chat.id, full_group_analysis(context.bot, chat, user.id, status))
 
 async def wait_for_userbot_completion(group_id, timeout=300):
     """Ожидаем завершения проверки UserBot"""
-    start_time = time.time()
     logger.info(f"⏳ Ожидаю завершения UserBot проверки для группы {group_id}")
     
-    while (time.time() - start_time) < timeout:
-      
-        result = get_userbot_result(group_id)
-        
-        if result is not None:
-            logger.info(f"✅ UserBot завершил проверку группы {group_id}")
-            return result
-        
-      
-        await asyncio.sleep(5)
+    # UserBot сам сообщает о готовности результата через канал sync_manager
+    result = await sync_manager.wait_for_userbot_result(group_id, timeout)
+    
+    if result is not None and not result.get('timeout'):
+        logger.info(f"✅ UserBot завершил проверку группы {group_id}")
+        return result
     
-    logger.warning(f"⏰ Таймаут ожидания UserBot для группы {group_id}")
     return None
 
-async def full_group_analysis(bot, chat, user_id):
-    """Полный анализ группы"""
+async def full_group_analysis(bot, chat, user_id, status=None):
+    """Полный анализ группы по этапам конвейера; ход проверки - в одном статусном сообщении"""
+    if status is None:
+        status = StatusMessage(bot, chat.id)
+    
     try:
-       
-        await bot.send_message(chat.id, "🔐 Проверяю права администратора...")
-        is_admin, bot_member = await check_bot_admin_rights(bot, chat.id)
-        
-        if not is_admin:
-            await bot.send_message(chat.id, "❌ Не предоставлены права администратора!\n\nПожалуйста, сделайте бота администратором для продолжения проверки.")
-            return
-        
-        await bot.send_message(chat.id, "✅ Права администратора получены!")
-        
-  
-        await bot.send_message(chat.id, "🔗 Создаю приглашение для углубленного анализа...")
-        invite_link = await create_invite_link(bot, chat.id)
-        
-        if not invite_link:
-            await bot.send_message(chat.id, "❌ Не удалось создать пригласительную ссылку!\n\nПроверьте права бота.")
-            return
-        
-      
-        queue_id = add_to_queue(chat.id, chat.title, user_id, invite_link)
-        logger.info(f"📝 Группа {chat.title} добавлена в очередь (ID: {queue_id})")
-        
-        # 4. Проводим веб-проверку
-        await bot.send_message(chat.id, "🌐 Провожу веб-анализ...")
-        web_check_result = await perform_web_check(bot, chat.id)
-        
-     
-        geo_check_result = await check_geo_by_name(chat.title)
-        
-       
-        bot_result = {
-            'web_check': web_check_result,
-            'geo_check': geo_check_result,
-            'chat_info': {
-                'title': chat.title,
-                'id': chat.id,
-                'type': chat.type
-            },
-            'timestamp': str(time.time())
-        }
-        
-  
-        await bot.send_message(chat.id, "🤖 Ожидаю результаты углубленного анализа...\n\nЭто может занять несколько минут.")
-        logger.info(f"⏳ Ожидаю UserBot для группы {chat.id}")
-        
-       
-        userbot_result = await wait_for_userbot_completion(chat.id)
-        
-        if userbot_result is None:
-            await bot.send_message(chat.id, "❌ UserBot не ответил вовремя.\n\nПопробуйте добавить бота в группу позже.")
-            return
-        
-     
-        await bot.send_message(chat.id, "📊 Формирую отчет...")
-        final_report = await generate_final_report(bot_result, userbot_result)
-        
-        # 9. Отправляем отчет  await send_final_report(bot, chat.id, user_id, final_report)
+        # 1. Права администратора
+        async with onboarding.stage('admin_check'):
+            await status.update("🔐 Проверяю права администратора...")
+            is_admin, bot_member = await check_bot_admin_rights(bot, chat.id)
+            
+            if not is_admin:
+                await status.finish("❌ Не предоставлены права администратора!\n\nПожалуйста, сделайте бота администратором для продолжения проверки.")
+                return
+            
+            await status.update("✅ Права администратора получены!")
         
+        # 2. Пригласительная ссылка для UserBot
+        async with onboarding.stage('invite'):
+            await status.update("🔗 Создаю приглашение для углубленного анализа...")
+            invite_link = await create_invite_link(bot, chat.id)
+            
+            if not invite_link:
+                await status.finish("❌ Не удалось создать пригласительную ссылку!\n\nПроверьте права бота.")
+                return
+        
+        # 3. Постановка в очередь UserBot
+        async with onboarding.stage('enqueue'):
+            # Проверки, запущенные администратором, UserBot берет первыми
+            priority = QUEUE_PRIORITY_ADMIN if user_id == ADMIN_ID else 0
+            queue_id = await add_to_queue(chat.id, chat.title, user_id, invite_link, priority)
+            sync_manager.notify_new_check()
+            logger.info(f"📝 Группа {chat.title} добавлена в очередь (ID: {queue_id})")
+            
+            # ID статусного сообщения - нижняя граница свежих ID в группе для веб-проверки,
+            # отдельное пробное сообщение не нужно
+            await status.update("🌐 Провожу веб-анализ...")
+            geo_check_result = await check_geo_by_name(chat.title)
+        
+        # 4. Ожидание UserBot
+        async with onboarding.stage('wait'):
+            await status.update("🤖 Ожидаю результаты углубленного анализа...\n\nЭто может занять несколько минут.")
+            logger.info(f"⏳ Ожидаю UserBot для группы {chat.id}")
+            
+            userbot_result = await wait_for_userbot_completion(chat.id)
+            
+            if userbot_result is None:
+                await status.finish("❌ UserBot не ответил вовремя.\n\nПопробуйте добавить бота в группу позже.")
+                return
         
-        issues = await identify_issues(bot_result, userbot_result)
-        final_result = len(issues) == 0
+        # 5. Веб-проверка: самый ранний ID сообщения известен только после анализа UserBot
+        async with onboarding.stage('web_check'):
+            web_check_result = await perform_web_check(status.message_id, userbot_result, chat.type)
+            
+            bot_result = {
+                'web_check': web_check_result,
+                'geo_check': geo_check_result,
+                'chat_info': {
+                    'title': chat.title,
+                    'id': chat.id,
+                    'type': chat.type
+                },
+                'timestamp': str(time.time())
+            }
         
-        save_check_result(
-            group_id=chat.id,
-            group_title=chat.title,
-            user_id=user_id,
-            bot_result=bot_result,
-            userbot_result=userbot_result,
-            final_result=final_result,
-            issues=", ".join(issues)
-        )
+        # 6. Отчет
+        async with onboarding.stage('report'):
+            await status.update("📊 Формирую отчет...")
+            final_report = await generate_final_report(bot_result, userbot_result)
+            
+            await send_final_report(bot, chat.id, user_id, final_report, status)
+            
+            issues = await identify_issues(bot_result, userbot_result)
+            final_result = len(issues) == 0
+            
+            await save_check_result(
+                group_id=chat.id,
+                group_title=chat.title,
+                user_id=user_id,
+                bot_result=bot_result,
+                userbot_result=userbot_result,
+                final_result=final_result,
+                issues=", ".join(issues),
+                queue_id=queue_id
+            )
         
         logger.info(f"✅ Полная проверка группы {chat.title} завершена")
         
     except Exception as e:
         logger.error(f"❌ Ошибка в полном анализе группы: {e}")
-        await bot.send_message(chat.id, f"❌ Произошла ошибка при анализе:\n\n{str(e)}")
+        await status.finish(f"❌ Произошла ошибка при анализе:\n\n{str(e)}")
 
 async def generate_final_report(bot_result, userbot_result):
     """Генерируем финальный отчет"""
@@ -367,7 +372,7 @@ async def generate_final_report(bot_result, userbot_result):
                 report += "✅ \n"
             elif method in ['full_chat_date', 'entity_date']:
                 report += "✅ \n"
-            elif method == 'oldest_message_found':
+            elif method in ['oldest_message_found', 'message_id_probe']:
                 report += "📅 (по найденным сообщениям)\n"
             else:
                 report += "⚡ (оценочная)\n"
@@ -478,14 +483,12 @@ async def identify_issues(bot_result, userbot_result):
     
     return issues
 
-async def send_final_report(bot, chat_id, user_id, report):
+async def send_final_report(bot, chat_id, user_id, report, status=None):
     """Отправляем финальный отчет"""
     try:
-        # В группу
-        await bot.send_message(
-            chat_id=chat_id,
-            text=report
-        )
+        # В группу: отчет заменяет текст статусного сообщения, если помещается в него
+        if status is None or len(report) > MAX_MESSAGE_LENGTH or not await status.finish(report):
+            await send_queue.send_message(bot, chat_id, report, PRIORITY_REPORT)
         
     except Exception as e:
         logger.error(f"❌ Ошибка отправки отчета: {e}")
@@ -493,37 +496,123 @@ async def send_final_report(bot, chat_id, user_id, report):
         try:
             parts = [report[i:i+4000] for i in range(0, len(report), 4000)]
             for part in parts:
-                await bot.send_message(chat_id=chat_id, text=part)
+                await send_queue.send_message(bot, chat_id, part, PRIORITY_REPORT)
         except Exception as e2:
             logger.error(f"❌ Не удалось отправить отчет даже частями: {e2}")
         
 
     try:
-        await bot.send_message(
-            chat_id=user_id,
-            text=f"📋 Отчет по группе завершен!\n\n{report}"
+        await send_queue.send_message(
+            bot, user_id, f"📋 Отчет по группе завершен!\n\n{report}", PRIORITY_REPORT
         )
     except Exception as e:
         logger.warning(f"Не удалось отправить отчет в ЛС пользователю {user_id}: {e}")
 
-def main():
-    """Запуск основного бота"""
-    application = Application.builder().token(BOT_TOKEN).build()
+async def on_startup(application: Application):
+    """Поднимаем канал получения результатов от UserBot"""
+    await sync_manager.start_listener()
+    send_queue.start()
+    
+    # Под супервизором main.py сообщаем, что цикл событий бота жив
+    heartbeat = application.bot_data.get('heartbeat')
+    if heartbeat is not None:
+        heartbeat.start()
+
+async def on_shutdown(application: Application):
+    """Освобождаем ресурсы процесса при остановке бота"""
+    await onboarding.shutdown()
+    await send_queue.stop()
+    await sync_manager.stop_listener()
+    await close_db()
+
+def build_application():
+    """Создаем приложение основного бота со всеми обработчиками"""
+    # Медленный обработчик (ожидание прав, запросы к БД) не задерживает остальные обновления
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("otkat", otkat_command))
+    application.add_handler(CommandHandler("queue", queue_command))
     application.add_handler(MessageHandler(
         filters.StatusUpdate.NEW_CHAT_MEMBERS, 
         handle_bot_added_to_group
     ))
+    # Повышение бота до администратора продолжает проверку группы без опроса
+    application.add_handler(ChatMemberHandler(admin_watcher.handle_update, ChatMemberHandler.MY_CHAT_MEMBER))
+    
+    return application
+
+def get_webhook_settings():
+    """Параметры webhook или None (polling); tornado - необязательная зависимость python-telegram-bot[webhooks]"""
+    if not BOT_WEBHOOK_URL:
+        return None
+    
+    try:
+        import tornado  # noqa: F401
+    except ImportError:
+        logger.warning('⚠️ Для режима webhook нужен tornado: pip install "python-telegram-bot[webhooks]". Работаю через polling')
+        return None
+    
+    return {
+        'listen': BOT_WEBHOOK_LISTEN,
+        'port': BOT_WEBHOOK_PORT,
+        'url_path': BOT_WEBHOOK_PATH,
+        'webhook_url': f"{BOT_WEBHOOK_URL.rstrip('/')}/{BOT_WEBHOOK_PATH}",
+        # Запросы без секрета сервер отклоняет - чужой POST не подделает обновление
+        'secret_token': BOT_WEBHOOK_SECRET or secrets.token_urlsafe(32),
+    }
+
+async def run_bot_in_loop(application):
+    """Запуск основного бота в работающем цикле событий (режим одного процесса); остановка - stop_bot_in_loop()"""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    
+    webhook = get_webhook_settings()
+    if webhook is not None:
+        await application.updater.start_webhook(allowed_updates=Update.ALL_TYPES, **webhook)
+        logger.info(f"🌐 Webhook слушает {BOT_WEBHOOK_LISTEN}:{BOT_WEBHOOK_PORT}/{BOT_WEBHOOK_PATH}")
+    else:
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    await application.start()
+
+async def stop_bot_in_loop(application):
+    """Остановка основного бота, запущенного через run_bot_in_loop()"""
+    if application.updater.running:
+        await application.updater.stop()
+    if application.running:
+        await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+def main(heartbeat=None):
+    """Запуск основного бота"""
+    application = build_application()
+    if heartbeat is not None:
+        application.bot_data['heartbeat'] = heartbeat
     
     print("🤖 Основной бот запущен!")
     print("💡 Добавьте бота в группу для начала проверки")
     print("🔧 Убедитесь, что UserBot также запущен")
     print("🔗 Команда /otkat <group_id> - выход из группы")
+    print("📊 Команда /queue - состояние очереди проверок")
     
-    application.run_polling()
+    # my_chat_member нужен для ожидания прав администратора
+    webhook = get_webhook_settings()
+    if webhook is not None:
+        print(f"🌐 Режим webhook: {webhook['webhook_url']} -> {BOT_WEBHOOK_LISTEN}:{BOT_WEBHOOK_PORT}")
+        application.run_webhook(allowed_updates=Update.ALL_TYPES, **webhook)
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,88 @@
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from config import ONBOARDING_STAGE_LIMITS
+
+logger = logging.getLogger(__name__)
+
+class OnboardingPipeline:
+    """Подключение групп как конвейер этапов, у каждого этапа свой лимит параллельности"""
+
+    def __init__(self, stage_limits):
+        self.stage_limits = stage_limits
+        self._semaphores = {}
+        self.tasks = {}
+        self.stats = {
+            stage: {'active': 0, 'waiting': 0, 'passed': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0}
+            for stage in stage_limits
+        }
+
+    def _semaphore(self, stage):
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(self.stage_limits[stage])
+        return self._semaphores[stage]
+
+    @asynccontextmanager
+    async def stage(self, name):
+        """Этап конвейера: ждем свободный слот этапа и учитываем время ожидания и работы"""
+        stats = self.stats[name]
+        stats['waiting'] += 1
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore(name).acquire()
+        finally:
+            stats['waiting'] -= 1
+
+        started_at = time.monotonic()
+        stats['wait_seconds'] += started_at - queued_at
+        stats['active'] += 1
+        try:
+            yield
+        finally:
+            stats['active'] -= 1
+            stats['passed'] += 1
+            stats['run_seconds'] += time.monotonic() - started_at
+            self._semaphore(name).release()
+
+    def submit(self, chat_id, coro):
+        """Запускаем подключение группы; повторное добавление той же группы не дублирует проверку"""
+        task = self.tasks.get(chat_id)
+        if task is not None and not task.done():
+            coro.close()
+            logger.info(f"⏩ Подключение группы {chat_id} уже выполняется")
+            return task
+
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks[chat_id] = task
+        task.add_done_callback(lambda finished: self._forget(chat_id, finished))
+        return task
+
+    def _forget(self, chat_id, task):
+        if self.tasks.get(chat_id) is task:
+            del self.tasks[chat_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"❌ Подключение группы {chat_id} завершилось ошибкой: {task.exception()}")
+
+    async def shutdown(self):
+        """Отменяем все незавершенные подключения и дожидаемся их остановки"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"🛑 Отменено подключений групп: {len(tasks)}")
+
+    def summary(self):
+        """Краткая сводка по этапам для логов и команды /queue"""
+        parts = []
+        for stage, stats in self.stats.items():
+            avg_wait = stats['wait_seconds'] / stats['passed'] if stats['passed'] else 0
+            parts.append(
+                f"{stage}: {stats['active']}/{self.stage_limits[stage]} в работе, "
+                f"{stats['waiting']} ждут, ожидание в среднем {avg_wait:.1f} сек"
+            )
+        return f"{len(self.tasks)} подключений; " + "; ".join(parts)
+
+# Глобальный конвейер подключения групп основного бота
+onboarding = OnboardingPipeline(ONBOARDING_STAGE_LIMITS)
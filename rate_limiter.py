@@ -0,0 +1,242 @@
+import asyncio
+import time
+import logging
+from telethon.errors import (
+    FloodWaitError, UserDeactivatedBanError, UserDeactivatedError,
+    AuthKeyUnregisteredError, SessionRevokedError
+)
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер страницы истории в MTProto (messages.getHistory)
+HISTORY_PAGE_SIZE = 100
+
+# Ошибки, после которых аккаунт больше не может работать (бан или потеря сессии)
+FATAL_ACCOUNT_ERRORS = (
+    UserDeactivatedBanError, UserDeactivatedError,
+    AuthKeyUnregisteredError, SessionRevokedError
+)
+
+class TokenBucket:
+    """Ведро токенов: в среднем rate запросов в секунду, не более capacity подряд"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Ждем свободный токен, возвращаем время ожидания в секундах"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        waited = 0.0
+        # Очередь ожидающих обслуживается по порядку, без обгона
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+        return waited
+
+    def try_acquire(self):
+        """Берем токен без ожидания: 0 - токен взят, иначе сколько секунд ждать следующего"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class TelegramRateLimiter:
+    """Лимитер вызовов Telegram API: свой бюджет и своя пауза FloodWait на каждый метод"""
+
+    def __init__(self, budgets, max_flood_wait, name="userbot"):
+        self.budgets = budgets
+        self.max_flood_wait = max_flood_wait
+        self.name = name
+        self._buckets = {}
+        self._parked_until = {}
+        self.stats = {}
+        # Первая фатальная ошибка аккаунта (бан, отозванная сессия)
+        self.fatal_error = None
+
+    def _bucket(self, method):
+        if method not in self._buckets:
+            per_minute, burst = self.budgets.get(method, self.budgets['default'])
+            self._buckets[method] = TokenBucket(per_minute / 60, burst)
+        return self._buckets[method]
+
+    def _method_stats(self, method):
+        if method not in self.stats:
+            self.stats[method] = {
+                'calls': 0,
+                'throttled': 0,
+                'throttled_seconds': 0.0,
+                'flood_waits': 0,
+                'flood_wait_seconds': 0,
+                'errors': 0
+            }
+        return self.stats[method]
+
+    def parked_for(self, method=None):
+        """Сколько секунд еще заблокирован метод (или любой метод, если не указан)"""
+        now = time.monotonic()
+        if method is not None:
+            return max(0.0, self._parked_until.get(method, 0) - now)
+        return max([0.0] + [until - now for until in self._parked_until.values()])
+
+    async def acquire(self, method):
+        """Ждем разрешения на один запрос метода, который выполняется в обход call()"""
+        stats = self._method_stats(method)
+
+        # Те же быстрые отказы, что и в call()
+        if self.fatal_error is not None:
+            raise self.fatal_error
+
+        parked = self.parked_for(method)
+        if parked > self.max_flood_wait:
+            raise FloodWaitError(request=None, capture=int(parked))
+        if parked > 0:
+            await asyncio.sleep(parked)
+
+        waited = await self._bucket(method).acquire()
+        if waited > 0:
+            stats['throttled'] += 1
+            stats['throttled_seconds'] += waited
+        stats['calls'] += 1
+
+    def record_flood_wait(self, method, seconds):
+        """Учитываем FloodWait, пойманный в обход call()"""
+        stats = self._method_stats(method)
+        stats['flood_waits'] += 1
+        stats['flood_wait_seconds'] += seconds
+        self._parked_until[method] = time.monotonic() + seconds
+        logger.warning(f"🌊 [{self.name}] FloodWait {seconds} сек на {method}")
+
+    async def call(self, method, func, *args, **kwargs):
+        """Выполняем вызов с учетом бюджета метода и FloodWait"""
+        stats = self._method_stats(method)
+
+        while True:
+            # Забаненный аккаунт больше не дергаем - сразу отдаем ту же ошибку
+            if self.fatal_error is not None:
+                raise self.fatal_error
+
+            parked = self.parked_for(method)
+            # Не держим воркер дольше допустимого - пусть группу возьмет другой аккаунт
+            if parked > self.max_flood_wait:
+                raise FloodWaitError(request=None, capture=int(parked))
+            if parked > 0:
+                logger.info(f"🧊 [{self.name}] {method} заблокирован FloodWait, жду {parked:.0f} сек")
+                await asyncio.sleep(parked)
+
+            waited = await self._bucket(method).acquire()
+            if waited > 0:
+                stats['throttled'] += 1
+                stats['throttled_seconds'] += waited
+
+            # Пока ждали токен, другой вызов мог поймать FloodWait по этому методу
+            if self.parked_for(method) > 0:
+                continue
+
+            stats['calls'] += 1
+            try:
+                return await func(*args, **kwargs)
+            except FloodWaitError as e:
+                self.record_flood_wait(method, e.seconds)
+
+                # Слишком долгое ожидание держит воркер - отдаем ошибку вызывающему коду
+                if e.seconds > self.max_flood_wait:
+                    raise
+            except FATAL_ACCOUNT_ERRORS as e:
+                stats['errors'] += 1
+                if self.fatal_error is None:
+                    self.fatal_error = e
+                    logger.error(f"⛔ [{self.name}] Аккаунт больше не может работать: {e}")
+                raise
+            except Exception:
+                stats['errors'] += 1
+                raise
+
+    def summary(self):
+        """Краткая сводка счетчиков для логов"""
+        parts = []
+        for method, stats in sorted(self.stats.items()):
+            parts.append(
+                f"{method}: {stats['calls']} вызовов, "
+                f"{stats['throttled']} задержано, "
+                f"{stats['flood_waits']} FloodWait ({stats['flood_wait_seconds']} сек)"
+            )
+        return "; ".join(parts) if parts else "вызовов не было"
+
+class RateLimitedClient:
+    """Обертка над TelegramClient: сетевые вызовы анализатора идут через лимитер"""
+
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+        # FloodWait обрабатывает лимитер, а не встроенный автосон Telethon
+        client.flood_sleep_threshold = 0
+
+    async def __call__(self, request):
+        return await self.limiter.call(type(request).__name__, self.client, request)
+
+    async def get_entity(self, *args, **kwargs):
+        return await self.limiter.call('get_entity', self.client.get_entity, *args, **kwargs)
+
+    async def get_messages(self, *args, **kwargs):
+        return await self.limiter.call('get_messages', self.client.get_messages, *args, **kwargs)
+
+    async def get_messages_by_ids(self, *args, **kwargs):
+        """get_messages(ids=[...]) - отдельный бюджет, чтобы поиск даты создания не отнимал его у окон сообщений"""
+        return await self.limiter.call('GetMessagesRequest', self.client.get_messages, *args, **kwargs)
+
+    async def get_participants(self, *args, **kwargs):
+        return await self.limiter.call('get_participants', self.client.get_participants, *args, **kwargs)
+
+    async def iter_messages(self, *args, **kwargs):
+        """Потоковое чтение истории: бюджет GetHistoryRequest списывается за каждую страницу"""
+        count = 0
+        try:
+            async for message in self.client.iter_messages(*args, **kwargs):
+                # Telethon читает историю страницами по HISTORY_PAGE_SIZE сообщений
+                if count % HISTORY_PAGE_SIZE == 0:
+                    await self.limiter.acquire('GetHistoryRequest')
+                count += 1
+                yield message
+        except FloodWaitError as e:
+            # Быстрый отказ самого лимитера (request=None) уже учтен
+            if e.request is not None:
+                self.limiter.record_flood_wait('GetHistoryRequest', e.seconds)
+            raise
+
+    async def iter_dialogs(self, *args, **kwargs):
+        """Потоковое чтение списка диалогов: бюджет GetDialogsRequest списывается за каждую страницу"""
+        count = 0
+        try:
+            async for dialog in self.client.iter_dialogs(*args, **kwargs):
+                if count % HISTORY_PAGE_SIZE == 0:
+                    await self.limiter.acquire('GetDialogsRequest')
+                count += 1
+                yield dialog
+        except FloodWaitError as e:
+            # Быстрый отказ самого лимитера (request=None) уже учтен
+            if e.request is not None:
+                self.limiter.record_flood_wait('GetDialogsRequest', e.seconds)
+            raise
+
+    async def delete_dialog(self, *args, **kwargs):
+        return await self.limiter.call('delete_dialog', self.client.delete_dialog, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
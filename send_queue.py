@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import time
+import logging
+from collections import deque
+from telegram.error import RetryAfter
+from rate_limiter import TokenBucket
+from database import percentile
+from config import (
+    SEND_QUEUE_WORKERS, SEND_GLOBAL_RATE, SEND_RATE_LIMITS,
+    SEND_MAX_RETRIES, SEND_LATENCY_SAMPLE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты отправки: меньше - раньше
+PRIORITY_REPORT = 0
+PRIORITY_PROGRESS = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_REPORT: "отчеты",
+    PRIORITY_PROGRESS: "статусы",
+}
+
+class SendQueue:
+    """Общая очередь исходящих запросов Bot API с приоритетами и лимитами на бота и на чат"""
+
+    def __init__(self, workers, global_rate, rate_limits, max_retries, sample_size):
+        self.workers = workers
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(*global_rate)
+        self._heap = []
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._busy = set()
+        self._deferred = {}
+        self._wakeup = None
+        self._tasks = []
+        self.latencies = deque(maxlen=sample_size)
+        self.sent = 0
+        self.failed = 0
+        self.retry_afters = 0
+
+    def _bucket(self, chat_id):
+        if chat_id not in self._buckets:
+            # Положительный ID - личный чат, отрицательный - группа или канал
+            per_minute, burst = self.rate_limits['private' if chat_id > 0 else 'group']
+            self._buckets[chat_id] = TokenBucket(per_minute / 60, burst)
+        return self._buckets[chat_id]
+
+    def start(self):
+        """Запускаем воркеры отправки (повторный вызов ничего не делает)"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"📤 Очередь отправки запущена: {self.workers} воркеров")
+
+    async def stop(self):
+        """Останавливаем воркеры; неотправленные запросы завершаются отменой"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        items = self._heap + [item for waiting in self._deferred.values() for item in waiting]
+        for item in items:
+            future = item[5]
+            if not future.done():
+                future.cancel()
+        self._heap = []
+        self._deferred = {}
+        self._busy = set()
+
+    async def call(self, target, priority, func, *args, **kwargs):
+        """Выполняем запрос func(*args, **kwargs) в чат target через очередь и возвращаем его результат"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        item = (priority, next(self._seq), time.monotonic(), target, (func, args, kwargs), future, 0)
+        heapq.heappush(self._heap, item)
+        self._wakeup.set()
+        return await future
+
+    async def send_message(self, bot, chat_id, text, priority=PRIORITY_PROGRESS, **kwargs):
+        return await self.call(chat_id, priority, bot.send_message, chat_id=chat_id, text=text, **kwargs)
+
+    async def edit_message_text(self, bot, chat_id, message_id, text, priority=PRIORITY_PROGRESS, **kwargs):
+        return await self.call(
+            chat_id, priority, bot.edit_message_text, text, chat_id=chat_id, message_id=message_id, **kwargs
+        )
+
+    def _defer(self, item):
+        heapq.heappush(self._deferred.setdefault(item[3], []), item)
+
+    def _release_chat(self, chat_id):
+        """Чат снова может отправлять: отложенные запросы возвращаются в общую очередь"""
+        self._busy.discard(chat_id)
+        for item in self._deferred.pop(chat_id, []):
+            heapq.heappush(self._heap, item)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pop_ready(self):
+        """Самый приоритетный запрос чата, который может отправлять прямо сейчас"""
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            chat_id, future = item[3], item[5]
+            if future.done():
+                # Вызывающая задача отменена - отправлять уже некому
+                continue
+            if chat_id in self._busy:
+                self._defer(item)
+                continue
+
+            delay = self._bucket(chat_id).try_acquire()
+            self._busy.add(chat_id)
+            if delay > 0:
+                # Лимит чата исчерпан: не держим воркер, вернемся к чату, когда появится токен
+                self._defer(item)
+                asyncio.get_running_loop().call_later(delay, self._release_chat, chat_id)
+                continue
+            return item
+        return None
+
+    async def _next_item(self):
+        while True:
+            item = self._pop_ready()
+            if item is not None:
+                return item
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _worker(self):
+        while True:
+            # Сначала общий токен, потом выбор запроса - приоритет учитывается в момент отправки
+            await self.global_bucket.acquire()
+            item = await self._next_item()
+            await self._send(item)
+
+    async def _send(self, item):
+        priority, seq, enqueued_at, chat_id, (func, args, kwargs), future, attempts = item
+        if attempts == 0:
+            self.latencies.append(time.monotonic() - enqueued_at)
+        try:
+            result = await func(*args, **kwargs)
+            self.sent += 1
+            if not future.done():
+                future.set_result(result)
+        except RetryAfter as e:
+            self.retry_afters += 1
+            if attempts < self.max_retries:
+                # Чат остается занятым на время паузы, запрос ждет среди отложенных - воркер свободен
+                logger.warning(f"🌊 RetryAfter {e.retry_after} сек для чата {chat_id}")
+                self._defer(item[:6] + (attempts + 1,))
+                asyncio.get_running_loop().call_later(e.retry_after, self._release_chat, chat_id)
+                return
+            self._fail(future, e)
+        except Exception as e:
+            self._fail(future, e)
+        self._release_chat(chat_id)
+
+    def _fail(self, future, error):
+        self.failed += 1
+        if not future.done():
+            future.set_exception(error)
+
+    def depth(self):
+        """Число запросов в очереди по приоритетам"""
+        counts = {}
+        items = self._heap + [item for waiting in self._deferred.values() for item in waiting]
+        for item in items:
+            if not item[5].done():
+                counts[item[0]] = counts.get(item[0], 0) + 1
+        return counts
+
+    def summary(self):
+        """Краткая сводка для логов и /queue"""
+        depth = self.depth()
+        queued = ", ".join(
+            f"{PRIORITY_NAMES.get(priority, priority)} {count}" for priority, count in sorted(depth.items())
+        ) or "пусто"
+        samples = list(self.latencies)
+        if samples:
+            latency = f"ожидание p50 {percentile(samples, 50):.1f} сек, p95 {percentile(samples, 95):.1f} сек"
+        else:
+            latency = "отправок не было"
+        return (
+            f"в очереди: {queued}; {latency}; отправлено {self.sent}, "
+            f"ошибок {self.failed}, RetryAfter {self.retry_afters}"
+        )
+
+send_queue = SendQueue(
+    SEND_QUEUE_WORKERS, SEND_GLOBAL_RATE, SEND_RATE_LIMITS,
+    SEND_MAX_RETRIES, SEND_LATENCY_SAMPLE_SIZE
+)
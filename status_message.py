@@ -0,0 +1,84 @@
+import asyncio
+import time
+import logging
+from telegram.error import BadRequest
+from config import STATUS_EDIT_INTERVAL
+from send_queue import send_queue, PRIORITY_REPORT, PRIORITY_PROGRESS
+
+logger = logging.getLogger(__name__)
+
+class StatusMessage:
+    """Статусное сообщение группы: редактируется на месте не чаще раза в min_interval секунд"""
+
+    def __init__(self, bot, chat_id, min_interval=STATUS_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id = None
+        self.text = None
+        self.sends = 0
+        self.edits = 0
+        self._pending = None
+        self._pending_priority = PRIORITY_PROGRESS
+        self._last_edit = 0
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    def attach(self, message):
+        """Используем уже отправленное сообщение (например, приветствие) как статусное"""
+        self.message_id = message.message_id
+        self.text = message.text
+        self._last_edit = time.monotonic()
+
+    async def update(self, text, priority=PRIORITY_PROGRESS):
+        """Новый текст статуса; отправка или редактирование - не чаще min_interval"""
+        if self.message_id is None:
+            async with self._lock:
+                if self.message_id is None:
+                    message = await send_queue.send_message(self.bot, self.chat_id, text, priority)
+                    self.sends += 1
+                    self.attach(message)
+                    return
+        
+        self._pending = text
+        self._pending_priority = priority
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def finish(self, text, priority=PRIORITY_REPORT):
+        """Итоговый текст статуса: дожидаемся, пока он окажется в сообщении; True - доставлен"""
+        await self.update(text, priority)
+        while self._pending is not None or (self._flush_task is not None and not self._flush_task.done()):
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            await self._flush_task
+        return self.text == text
+
+    async def _flush_later(self):
+        delay = self._last_edit + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._flush()
+
+    async def _flush(self):
+        async with self._lock:
+            text, self._pending = self._pending, None
+            priority = self._pending_priority
+            if text is None or text == self.text:
+                return
+            
+            # RetryAfter обрабатывает очередь отправки
+            try:
+                await send_queue.edit_message_text(self.bot, self.chat_id, self.message_id, text, priority)
+                self.edits += 1
+                self.text = text
+            except BadRequest as e:
+                # Текст не изменился - редактировать нечего
+                if "not modified" in str(e).lower():
+                    self.text = text
+                else:
+                    logger.warning(f"⚠️ Не удалось обновить статус в чате {self.chat_id}: {e}")
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка обновления статуса в чате {self.chat_id}: {e}")
+            
+            self._last_edit = time.monotonic()
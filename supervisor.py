@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import random
+import time
+import logging
+from collections import deque
+from config import (
+    SUPERVISOR_BACKOFF_BASE, SUPERVISOR_BACKOFF_MAX, SUPERVISOR_STABLE_TIME,
+    SUPERVISOR_CRASH_LOOP_MAX, SUPERVISOR_CRASH_LOOP_WINDOW, SUPERVISOR_CIRCUIT_COOLDOWN,
+    HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_STARTUP_GRACE
+)
+
+logger = logging.getLogger(__name__)
+
+class Heartbeat:
+    """Сторона дочернего процесса: сигнал супервизору из цикла событий, зависший цикл перестает его слать"""
+
+    def __init__(self, conn, interval=HEARTBEAT_INTERVAL):
+        self.conn = conn
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        """Запускаем отправку сигналов в текущем цикле событий"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                self.conn.send(time.time())
+            except (BrokenPipeError, OSError):
+                # Супервизор завершился - сигналы больше некому читать
+                return
+            await asyncio.sleep(self.interval)
+
+class SupervisedProcess:
+    """Дочерний процесс под надзором: перезапуск с паузой, защита от цикла падений"""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.process = None
+        self._conn = None
+        self.started_at = 0
+        self.last_heartbeat = None
+        self.attempt = 0
+        self.next_start_at = 0
+        self.circuit_open_until = 0
+        self.crashes = deque()
+        self.restarts = 0
+
+    def start(self):
+        """Запускаем процесс и канал сигналов жизни"""
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=self.target, args=(child_conn,), name=self.name)
+        self.process.daemon = True
+        self.process.start()
+        # Передающий конец нужен только дочернему процессу
+        child_conn.close()
+        self._conn = parent_conn
+        self.started_at = time.monotonic()
+        self.last_heartbeat = None
+
+    def stop(self, timeout=5):
+        """Останавливаем процесс: сначала мягко, затем принудительно"""
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout)
+        if self._conn is not None:
+            self._conn.close()
+        self.process = None
+        self._conn = None
+
+    def _read_heartbeats(self):
+        try:
+            while self._conn.poll():
+                self._conn.recv()
+                self.last_heartbeat = time.monotonic()
+        except (EOFError, OSError):
+            # Процесс завершился - это заметит проверка is_alive()
+            pass
+
+    def failure_reason(self):
+        """Причина перезапуска (None - процесс работает нормально)"""
+        self._read_heartbeats()
+
+        if not self.process.is_alive():
+            return f"процесс завершился с кодом {self.process.exitcode}"
+
+        now = time.monotonic()
+        if self.last_heartbeat is None:
+            if now - self.started_at > HEARTBEAT_STARTUP_GRACE:
+                return f"нет сигнала жизни {HEARTBEAT_STARTUP_GRACE} сек после запуска"
+        elif now - self.last_heartbeat > HEARTBEAT_TIMEOUT:
+            return f"нет сигнала жизни {now - self.last_heartbeat:.0f} сек (процесс завис)"
+        return None
+
+    def backoff_delay(self):
+        """Экспоненциальная пауза со случайной составляющей: процессы не перезапускаются синхронно"""
+        delay = min(SUPERVISOR_BACKOFF_MAX, SUPERVISOR_BACKOFF_BASE * 2 ** self.attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_failure(self, reason):
+        """Учитываем падение и назначаем время следующего запуска"""
+        now = time.monotonic()
+        uptime = now - self.started_at
+        self.stop()
+
+        # Долго проработавший процесс упал не из-за ошибки запуска - начинаем паузы заново
+        if uptime > SUPERVISOR_STABLE_TIME:
+            self.attempt = 0
+
+        self.crashes.append(now)
+        while self.crashes and now - self.crashes[0] > SUPERVISOR_CRASH_LOOP_WINDOW:
+            self.crashes.popleft()
+
+        if len(self.crashes) >= SUPERVISOR_CRASH_LOOP_MAX:
+            self.circuit_open_until = now + SUPERVISOR_CIRCUIT_COOLDOWN
+            self.next_start_at = self.circuit_open_until
+            self.crashes.clear()
+            logger.error(
+                f"⛔ {self.name}: {SUPERVISOR_CRASH_LOOP_MAX} падений за {SUPERVISOR_CRASH_LOOP_WINDOW} сек - "
+                f"перезапуски приостановлены на {SUPERVISOR_CIRCUIT_COOLDOWN} сек. Последняя причина: {reason}"
+            )
+            print(f"⛔ {self.name} падает при каждом запуске, следующая попытка через {SUPERVISOR_CIRCUIT_COOLDOWN} сек")
+            return
+
+        delay = self.backoff_delay()
+        self.attempt += 1
+        self.next_start_at = now + delay
+        logger.warning(f"❌ {self.name}: {reason}, перезапуск через {delay:.1f} сек (работал {uptime:.0f} сек)")
+        print(f"❌ {self.name} остановился, перезапуск через {delay:.1f} сек")
+
+class Supervisor:
+    """Надзор за процессами системы: сигналы жизни, перезапуски, защита от цикла падений"""
+
+    def __init__(self, check_interval=1):
+        self.children = []
+        self.check_interval = check_interval
+
+    def add(self, name, target):
+        self.children.append(SupervisedProcess(name, target))
+
+    def tick(self):
+        """Один проход надзора по всем процессам"""
+        now = time.monotonic()
+        for child in self.children:
+            if child.process is None:
+                if now >= child.next_start_at:
+                    if child.restarts:
+                        logger.info(f"🔄 Перезапускаю {child.name} (перезапуск №{child.restarts})")
+                    child.start()
+                    child.restarts += 1
+                continue
+
+            reason = child.failure_reason()
+            if reason is not None:
+                child.record_failure(reason)
+
+    def run(self):
+        """Бесконечный цикл надзора (прерывается Ctrl+C)"""
+        while True:
+            self.tick()
+            time.sleep(self.check_interval)
+
+    def stop(self):
+        """Останавливаем все процессы"""
+        for child in self.children:
+            child.stop()
@@ -1,64 +1,250 @@
 import asyncio
+import json
+import os
+import secrets
 import time
 import logging
+from config import RESULT_CHANNEL_HOST, RESULT_CHANNEL_PORT
 from database import get_pending_checks, update_queue_status, save_check_result, get_userbot_result
 
 logger = logging.getLogger(__name__)
 
+# Общий секрет канала результатов. main.py генерирует его перед запуском
+# процессов, дочерние процессы наследуют его через переменные окружения
+RESULT_CHANNEL_TOKEN_ENV = "RESULT_CHANNEL_TOKEN"
+
+# Интервал проверки БД, если канал результатов поднять не удалось
+FALLBACK_POLL_INTERVAL = 5
+
+def get_channel_token():
+    """Секрет канала результатов текущего запуска (пустой при запуске без main.py)"""
+    return os.environ.get(RESULT_CHANNEL_TOKEN_ENV, "")
+
 class SyncManager:
     def __init__(self):
         self.pending_groups = {}
         self.callbacks = {}
-    
+        self._server = None
+        # В режиме одного процесса UserBot передает результаты напрямую, без канала
+        self.in_process = False
+        self._new_checks = None
+
     def register_callback(self, group_id, callback):
         """Регистрируем callback для уведомления о готовности результатов"""
         self.callbacks[group_id] = callback
         logger.info(f"📞 Зарегистрирован callback для группы {group_id}")
-    
-    async def wait_for_userbot_result(self, group_id, timeout=300):
-        """Ожидаем результаты от UserBot с улучшенной синхронизацией"""
-        start_time = time.time()
-        check_attempts = 0
-        
-        logger.info(f"⏳ Ожидаю результаты UserBot для группы {group_id}...")
+
+    async def start_listener(self):
+        """Поднимаем локальный канал, по которому UserBot сообщает о готовых результатах"""
+        if self.in_process:
+            return
         
-        while (time.time() - start_time) < timeout:
-            check_attempts += 1
-            
-            # Проверяем базу данных на наличие результатов
-            result = get_userbot_result(group_id)
-            
-            if result and result.get('join_success') is not None:
-                logger.info(f"✅ Получены результаты UserBot для группы {group_id} (попытка {check_attempts})")
-                
-                # Вызываем callback если зарегистрирован
-                if group_id in self.callbacks:
-                    logger.info(f"📞 Вызываю callback для группы {group_id}")
-                    try:
-                        await self.callbacks[group_id](result)
-                    except Exception as e:
-                        logger.error(f"❌ Ошибка в callback для группы {group_id}: {e}")
-                    finally:
-                        del self.callbacks[group_id]
-                
-                return result
-            
-            # Если результатов еще нет, ждем
-            wait_time = min(5, (timeout - (time.time() - start_time)) / 2)
-            if wait_time > 0:
-                logger.info(f"🕐 Результатов еще нет, жду {wait_time:.1f} сек... (попытка {check_attempts})")
-                await asyncio.sleep(wait_time)
+        # Без секрета любой локальный процесс мог бы подделать результат - остаемся на опросе БД
+        if not get_channel_token():
+            logger.warning("⚠️ Секрет канала результатов не задан (запуск без main.py), перехожу на опрос БД")
+            return
         
-        logger.warning(f"⏰ Таймаут ожидания UserBot для группы {group_id} после {check_attempts} попыток")
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_connection, RESULT_CHANNEL_HOST, RESULT_CHANNEL_PORT
+            )
+            logger.info(f"📡 Канал результатов слушает {RESULT_CHANNEL_HOST}:{RESULT_CHANNEL_PORT}")
+        except OSError as e:
+            self._server = None
+            logger.error(f"❌ Не удалось открыть канал результатов, перехожу на опрос БД: {e}")
+
+    async def stop_listener(self):
+        """Закрываем канал результатов"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        """Обслуживаем подключение UserBot"""
+        try:
+            hello = await reader.readline()
+            token = get_channel_token()
+            if not token or not secrets.compare_digest(hello.strip(), token.encode()):
+                logger.warning("⚠️ Отклонено подключение к каналу результатов с неверным секретом")
+                return
+
+            logger.info("🔌 UserBot подключился к каналу результатов")
+
+            # Пока UserBot был отключен, уведомления могли потеряться - сверяемся с БД
+            await self._resolve_pending_from_db()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    message = json.loads(line)
+                    await self.notify_result(message['group_id'], message.get('result'))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"⚠️ Некорректное сообщение в канале результатов: {e}")
+
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"🔌 Соединение с UserBot разорвано: {e}")
+        finally:
+            writer.close()
+
+    async def _resolve_pending_from_db(self):
+        """Проверяем в БД все группы, результаты которых еще ждут"""
+        for group_id in list(self.pending_groups):
+            result = await get_userbot_result(group_id)
+            if result is not None:
+                await self.notify_result(group_id, result)
+
+    async def notify_result(self, group_id, result):
+        """Передаем готовый результат всем, кто его ждет"""
+        for future in self.pending_groups.pop(group_id, []):
+            if not future.done():
+                future.set_result(result)
+
+        # Вызываем callback если зарегистрирован
+        if group_id in self.callbacks:
+            logger.info(f"📞 Вызываю callback для группы {group_id}")
+            try:
+                await self.callbacks[group_id](result)
+            except Exception as e:
+                logger.error(f"❌ Ошибка в callback для группы {group_id}: {e}")
+            finally:
+                del self.callbacks[group_id]
+
+    def notify_new_check(self):
+        """Будим воркеры UserBot: в очередь добавлена проверка (только в режиме одного процесса)"""
+        if self._new_checks is not None:
+            self._new_checks.set()
+
+    async def wait_for_new_check(self, timeout):
+        """Ждем новую проверку не дольше timeout (между процессами - просто пауза опроса)"""
+        if self._new_checks is None:
+            self._new_checks = asyncio.Event()
         
+        try:
+            await asyncio.wait_for(self._new_checks.wait(), timeout)
+            self._new_checks.clear()
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_for_userbot_result(self, group_id, timeout=300):
+        """Ожидаем результаты от UserBot по уведомлению, а не опросом БД"""
+        start_time = time.time()
+
+        logger.info(f"⏳ Ожидаю результаты UserBot для группы {group_id}...")
+
+        # Регистрируемся до проверки БД, чтобы не пропустить уведомление между ними
+        future = asyncio.get_running_loop().create_future()
+        self.pending_groups.setdefault(group_id, []).append(future)
+
+        try:
+            # Результат мог быть готов еще до начала ожидания
+            result = await get_userbot_result(group_id)
+            if result is not None:
+                await self.notify_result(group_id, result)
+
+            while not future.done():
+                remaining = timeout - (time.time() - start_time)
+                if remaining <= 0:
+                    break
+
+                # Без канала результатов остается только опрос БД
+                has_channel = self._server is not None or self.in_process
+                wait_time = remaining if has_channel else min(FALLBACK_POLL_INTERVAL, remaining)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), wait_time)
+                except asyncio.TimeoutError:
+                    if not has_channel:
+                        result = await get_userbot_result(group_id)
+                        if result is not None:
+                            await self.notify_result(group_id, result)
+
+            if future.done():
+                logger.info(f"✅ Получены результаты UserBot для группы {group_id} за {time.time() - start_time:.1f} сек")
+                return future.result()
+
+        finally:
+            waiters = self.pending_groups.get(group_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self.pending_groups[group_id]
+
+        logger.warning(f"⏰ Таймаут ожидания UserBot для группы {group_id}")
+
         # Удаляем callback при таймауте
         if group_id in self.callbacks:
             del self.callbacks[group_id]
-            
+
         return {
             'timeout': True,
             'error': f'UserBot не ответил в течение {timeout} секунд'
         }
 
+class ResultPublisher:
+    """Сторона UserBot: отправляет основному боту уведомления о готовых результатах"""
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._local = None
+
+    def attach(self, manager):
+        """Режим одного процесса: результаты сразу уходят в SyncManager основного бота"""
+        self._local = manager
+
+    async def _connect(self):
+        """Подключаемся к каналу результатов (или переподключаемся после обрыва)"""
+        if self._writer is not None and not self._reader.at_eof():
+            return self._writer
+
+        self.close()
+        self._reader, self._writer = await asyncio.open_connection(RESULT_CHANNEL_HOST, RESULT_CHANNEL_PORT)
+        self._writer.write((get_channel_token() + "\n").encode())
+        logger.info("🔌 Подключился к каналу результатов основного бота")
+        return self._writer
+
+    async def publish(self, group_id, result):
+        """Сообщаем, что результат для группы сохранен в БД"""
+        if self._local is not None:
+            await self._local.notify_result(group_id, result)
+            return
+        
+        # Без секрета основной бот канал не поднимает и сам забирает результат из БД
+        if not get_channel_token():
+            return
+        
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            try:
+                writer = await self._connect()
+                message = json.dumps({'group_id': group_id, 'result': result}, ensure_ascii=False)
+                writer.write((message + "\n").encode())
+                await writer.drain()
+            except (OSError, ConnectionError) as e:
+                # Результат уже в БД: бот заберет его оттуда при следующем подключении
+                logger.warning(f"⚠️ Не удалось уведомить основного бота о группе {group_id}: {e}")
+                self.close()
+
+    def close(self):
+        """Закрываем соединение с каналом результатов"""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
 # Глобальный менеджер синхронизации
 sync_manager = SyncManager()
+
+# Глобальный отправитель уведомлений (используется процессом UserBot)
+result_publisher = ResultPublisher()
+
+def use_in_process_channel():
+    """Основной бот и UserBot работают в одном цикле событий: обмен идет через память"""
+    sync_manager.in_process = True
+    result_publisher.attach(sync_manager)
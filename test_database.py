@@ -0,0 +1,101 @@
+import os
+import shutil
+import sqlite3
+import pytest
+import database
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'groups.db')
+
+TABLES = ('check_queue', 'group_checks', 'leave_queue')
+
+def _indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def _counts(conn):
+    return {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in TABLES}
+
+@pytest.fixture
+def old_db(tmp_path, monkeypatch):
+    """Копия groups.db в исходной схеме (user_version = 0, режим журнала delete)"""
+    path = tmp_path / 'groups.db'
+    shutil.copy(BASELINE_DB, path)
+    monkeypatch.setattr(database, 'DB_FILE', str(path))
+    return str(path)
+
+def test_init_db_upgrades_existing_database_in_place(old_db):
+    conn = sqlite3.connect(old_db)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    counts_before = _counts(conn)
+    conn.close()
+
+    # Повторный запуск (перезапуск процесса) ничего не меняет
+    database.init_db()
+    database.init_db()
+
+    conn = sqlite3.connect(old_db)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == len(database.SCHEMA_MIGRATIONS)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert _counts(conn) == counts_before
+
+        assert {
+            'idx_check_queue_status_created',
+            'idx_group_checks_group_created',
+            'idx_group_checks_queue',
+            'idx_entity_cache_invite',
+            'idx_check_queue_user_claimed',
+            'idx_userbot_memberships_group',
+            'idx_leave_queue_status_created',
+            'idx_check_queue_group_status',
+        } <= _indexes(conn)
+
+        # Старые строки очереди получили время постановки из created_at
+        missing = conn.execute('SELECT COUNT(*) FROM check_queue WHERE enqueued_at IS NULL').fetchone()[0]
+        assert missing == 0
+    finally:
+        conn.close()
+
+def test_save_check_result_upserts_by_queue_id(old_db):
+    database.init_db()
+
+    conn = sqlite3.connect(old_db)
+    try:
+        rows_before = conn.execute('SELECT COUNT(*) FROM group_checks').fetchone()[0]
+
+        # UserBot сохраняет свою часть, затем основной бот дописывает итог в ту же строку
+        conn.execute(database.SQL_SAVE_CHECK_RESULT, (777, -100, 'Группа', 1, '{}', '{"a": 1}', False, ''))
+        conn.execute(database.SQL_SAVE_CHECK_RESULT, (777, -100, 'Группа', 1, '{"b": 2}', '{"a": 1}', True, 'нет'))
+        conn.commit()
+
+        rows = conn.execute(
+            'SELECT bot_check_result, final_result, issues FROM group_checks WHERE queue_id = 777'
+        ).fetchall()
+        assert rows == [('{"b": 2}', 1, 'нет')]
+        assert conn.execute('SELECT COUNT(*) FROM group_checks').fetchone()[0] == rows_before + 1
+    finally:
+        conn.close()
+
+def test_expired_entity_cache_rows_are_ignored_and_pruned(old_db):
+    database.init_db()
+
+    conn = sqlite3.connect(old_db)
+    try:
+        now = 1_000_000
+        ttl = 3600
+        for group_id, invite_hash, updated_at in ((-1, 'fresh', now - 10), (-2, 'stale', now - ttl - 10)):
+            conn.execute(
+                database.SQL_SAVE_CACHED_ENTITY,
+                ('acc', group_id, invite_hash, 'channel', abs(group_id), 1, 'Группа', updated_at)
+            )
+
+        # Приглашение из устаревшей записи больше не считается известным
+        def lookup(invite_hash):
+            return conn.execute(database.SQL_GET_CACHED_GROUP_BY_INVITE, ('acc', invite_hash, now - ttl)).fetchall()
+
+        assert lookup('fresh') == [(-1,)]
+        assert lookup('stale') == []
+
+        assert conn.execute(database.SQL_DELETE_EXPIRED_ENTITIES, (now - ttl,)).rowcount == 1
+        assert conn.execute('SELECT group_id FROM entity_cache').fetchall() == [(-1,)]
+    finally:
+        conn.close()
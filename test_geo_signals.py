@@ -0,0 +1,37 @@
+import pytest
+from geo_signals import geo_matcher
+
+@pytest.mark.parametrize('title, expected', [
+    ('Чат Москвы', ['Москва']),
+    ('Московский клуб', ['Москва']),
+    ('msk_chat', ['Москва']),
+    ('СПБ24 новости', ['Санкт-Петербург']),
+    ('Питерские', ['Санкт-Петербург']),
+    ('Нижнем Новгороде', ['Нижний Новгород']),
+    ('ёлки Киеве', ['Киев']),
+    ('Kyiv / Львів', ['Киев', 'Львов']),
+    ('Ростов-на-Дону', ['Ростов-на-Дону']),
+    ('Самарская область', ['Самара']),
+    ('Барахолка Казани', ['Казань']),
+    ('Астана и Алма-Ата', ['Астана', 'Алматы']),
+    ('Россия и Украина, Москва', ['Россия', 'Украина', 'Москва']),
+    ('City life', ['город']),
+])
+def test_finds_geo_signals(title, expected):
+    assert geo_matcher.find(title) == expected
+
+@pytest.mark.parametrize('title', [
+    'velocity fans',
+    'спбгу',
+    'Перманентный макияж',
+    'Ростовщики',
+    'Казантип',
+    'Астанавливаюсь',
+    'Самарканд',
+    'Мария Львовна',
+    'Россини',
+    'Питерс',
+    'просто чат',
+])
+def test_ignores_words_that_only_contain_a_geo_stem(title):
+    assert geo_matcher.find(title) == []
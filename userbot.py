@@ -2,14 +2,36 @@ import asyncio
 import logging
 import sqlite3
 import os
-import random
+import sys
+import time
 from datetime import datetime
-from telethon import TelegramClient
-from telethon.tl.functions.channels import GetFullChannelRequest, JoinChannelRequest
-from telethon.tl.functions.messages import GetFullChatRequest, GetHistoryRequest, ImportChatInviteRequest
+from telethon import TelegramClient, utils
+from telethon.errors import UserAlreadyParticipantError, FloodWaitError
+from telethon.tl.functions.channels import GetFullChannelRequest, JoinChannelRequest, LeaveChannelRequest
+from telethon.tl.functions.messages import GetFullChatRequest, GetHistoryRequest, ImportChatInviteRequest, CheckChatInviteRequest
 from telethon.tl.types import Channel, Chat
-from config import USERBOT_API_ID, USERBOT_API_HASH, USERBOT_SESSION_FILE
-from database import update_queue_status, save_check_result, get_pending_checks, get_userbot_result  # ДОБАВЛЕН ИМПОРТ
+from config import (
+    USERBOT_API_ID, USERBOT_API_HASH, USERBOT_SESSION_FILES,
+    MESSAGE_WINDOW_SIZE, OLDEST_WINDOW_SIZE,
+    USERBOT_DEEP_SCAN, DEEP_SCAN_MAX_MESSAGES, DEEP_SCAN_MAX_SECONDS,
+    CREATION_PROBE_BATCH_SIZE, CREATION_PROBE_MAX_CALLS,
+    USERBOT_CONCURRENCY, USERBOT_CHECK_TIMEOUT, USERBOT_QUEUE_POLL_INTERVAL, USERBOT_JOIN_SETTLE_DELAY,
+    USERBOT_RATE_LIMITS, USERBOT_MAX_FLOOD_WAIT, USERBOT_STATS_INTERVAL,
+    ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL,
+    LEAVE_BATCH_SIZE, LEAVE_QUEUE_INTERVAL, LEAVE_SWEEP_INTERVAL
+)
+from database import (
+    update_queue_status, save_check_result, get_userbot_result, close_db,
+    claim_next_check, requeue_stale_checks, retry_check, get_queue_wait_stats, format_queue_wait_stats,
+    add_membership, remove_membership, get_group_members, get_account_memberships,
+    claim_leave_batch, update_leave_status, requeue_stale_leaves, add_to_leave_queue_once,
+    get_finished_check_groups, prune_entity_cache
+)
+from sync_manager import sync_manager, result_publisher
+from rate_limiter import TelegramRateLimiter, RateLimitedClient, FATAL_ACCOUNT_ERRORS
+from entity_cache import EntityCache
+from account_pool import UserbotAccount, AccountPool
+from geo_signals import geo_matcher
 
 # Настройка логирования
 logging.getLogger("telethon").setLevel(logging.WARNING)
@@ -19,32 +41,209 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class MessageSample:
+    """Компактная копия сообщения: только поля, которые читают проверки"""
+    
+    __slots__ = ('id', 'date', 'imported', 'saved_from_peer')
+    
+    def __init__(self, id, date, imported, saved_from_peer):
+        self.id = id
+        self.date = date
+        self.imported = imported
+        self.saved_from_peer = saved_from_peer
+    
+    @classmethod
+    def from_message(cls, message):
+        fwd_from = getattr(message, 'fwd_from', None)
+        return cls(
+            id=message.id,
+            date=getattr(message, 'date', None),
+            imported=bool(fwd_from and getattr(fwd_from, 'imported', False)),
+            saved_from_peer=bool(fwd_from and getattr(fwd_from, 'saved_from_peer', None))
+        )
+
+class MessageWindow:
+    """Выборка сообщений группы и общее число сообщений в истории"""
+    
+    def __init__(self, samples, total):
+        self.samples = samples
+        self.total = total
+    
+    def __len__(self):
+        return len(self.samples)
+
+class CreationDateEstimator:
+    """Поиск самого раннего сохранившегося сообщения супергруппы по ID: пачки, экспоненциальный и бинарный поиск"""
+    
+    def __init__(self, client, entity, batch_size, max_calls):
+        self.client = client
+        self.entity = entity
+        self.batch_size = batch_size
+        self.max_calls = max_calls
+        self.calls = 0
+    
+    async def _probe(self, start, end):
+        """Самое раннее живое сообщение среди ID [start, end) или None"""
+        self.calls += 1
+        ids = list(range(start, end))
+        messages = await self.client.get_messages_by_ids(self.entity, ids=ids)
+        alive = [message for message in messages if message is not None and getattr(message, 'date', None)]
+        return min(alive, key=lambda message: message.id) if alive else None
+    
+    async def estimate(self, max_id):
+        """Возвращаем (id, date, confidence) самого раннего найденного сообщения"""
+        batch = self.batch_size
+        
+        # Первая пачка: если здесь есть живое сообщение, оно точно самое раннее
+        found = await self._probe(1, min(batch, max_id) + 1)
+        if found is not None:
+            confidence = 'high' if found.id == 1 else 'medium'
+            return found.id, found.date, confidence
+        
+        # Экспоненциальный поиск: ID [1, low) проверены и пусты
+        low = batch + 1
+        start = low
+        while found is None and start <= max_id and self.calls < self.max_calls:
+            start = min(start * 2, max(max_id - batch + 1, low))
+            found = await self._probe(start, min(start + batch, max_id + 1))
+            if found is None:
+                low = start + batch
+            if start + batch > max_id:
+                break
+        
+        if found is None:
+            return None
+        
+        # Бинарный поиск между последней пустой пачкой и найденным сообщением
+        best = found
+        while best.id - low > batch and self.calls < self.max_calls:
+            middle = (low + best.id) // 2
+            candidate = await self._probe(middle, min(middle + batch, best.id))
+            if candidate is not None:
+                best = candidate
+            else:
+                low = middle + batch
+        
+        # Остаток диапазона помещается в одну пачку - проверяем его целиком
+        if low < best.id and self.calls < self.max_calls:
+            candidate = await self._probe(low, best.id)
+            if candidate is not None:
+                best = candidate
+        
+        # Непроверенные промежутки между пачками могли содержать более ранние сообщения
+        return best.id, best.date, 'low'
+
+class AnalysisContext:
+    """Данные одного запуска analyze_group, общие для всех проверок группы"""
+    
+    def __init__(self, client, entity):
+        self.client = client
+        self.entity = entity
+        self._full_chat = None
+        self._full_chat_error = None
+        self._full_chat_loaded = False
+        self._windows = {}
+    
+    async def _load_window(self, key, **kwargs):
+        """Загружаем окно сообщений один раз и сразу переводим в компактную форму"""
+        if key not in self._windows:
+            try:
+                messages = await self.client.get_messages(self.entity, **kwargs)
+                samples = [MessageSample.from_message(message) for message in messages]
+                total = getattr(messages, 'total', None)
+                self._windows[key] = MessageWindow(samples, total if total is not None else len(samples))
+            except Exception as e:
+                self._windows[key] = e
+        
+        window = self._windows[key]
+        if isinstance(window, Exception):
+            raise window
+        return window
+    
+    async def get_newest_window(self):
+        """Последние сообщения группы (от новых к старым)"""
+        return await self._load_window('newest', limit=MESSAGE_WINDOW_SIZE)
+    
+    async def get_oldest_window(self):
+        """Самые старые сохранившиеся сообщения группы (от старых к новым)"""
+        return await self._load_window('oldest', limit=OLDEST_WINDOW_SIZE, reverse=True)
+    
+    async def get_full_chat(self):
+        """Полная информация о чате: запрашивается один раз за весь анализ"""
+        if not self._full_chat_loaded:
+            self._full_chat_loaded = True
+            try:
+                if isinstance(self.entity, Channel):
+                    full_chat = await self.client(GetFullChannelRequest(self.entity))
+                else:
+                    full_chat = await self.client(GetFullChatRequest(self.entity.id))
+                self._full_chat = full_chat.full_chat
+            except Exception as e:
+                self._full_chat_error = e
+        
+        # Ошибку тоже запоминаем: повторять неудачный запрос в каждой проверке незачем
+        if self._full_chat_error is not None:
+            raise self._full_chat_error
+        return self._full_chat
+
 class GroupAnalyzer:
-    def __init__(self, client):
+    def __init__(self, client, entity_cache):
         self.client = client
+        self.entity_cache = entity_cache
+    
+    async def _resolve_entity(self, group_id):
+        """Полная сущность группы: из кэша или одним запросом get_entity"""
+        cached = await self.entity_cache.get(group_id)
+        if isinstance(cached, (Channel, Chat)):
+            return cached
+        
+        # Из базы приходит InputPeer: по нему get_entity не ищет группу по ID
+        entity = await self.client.get_entity(cached if cached is not None else group_id)
+        await self.entity_cache.put(entity)
+        return entity
     
     async def join_group(self, invite_link):
         """Присоединяемся к группе по ссылке - УНИВЕРСАЛЬНЫЙ МЕТОД"""
         try:
             logger.info(f"🔄 Пытаюсь присоединиться к группе: {invite_link}")
             
-            # Метод 1: Пробуем получить entity и присоединиться
+            invite_hash, is_invite = utils.parse_username(invite_link)
+            
+            # Метод 1: Приватная ссылка - сразу ImportChatInviteRequest
+            # (get_entity по такой ссылке не работает, пока мы не в группе)
+            if is_invite:
+                try:
+                    try:
+                        updates = await self.client(ImportChatInviteRequest(invite_hash))
+                        entity = updates.chats[0]
+                    except UserAlreadyParticipantError:
+                        # Уже в группе: если вступали по этой ссылке раньше, группа известна
+                        if await self.entity_cache.get_group_id_by_invite(invite_hash) is not None:
+                            logger.info(f"✅ Уже состоим в группе: {invite_link}")
+                            return True
+                        invite = await self.client(CheckChatInviteRequest(invite_hash))
+                        entity = invite.chat
+                    
+                    await self.entity_cache.put(entity, invite_hash=invite_hash)
+                    logger.info(f"✅ Успешно присоединились (метод 1): {invite_link}")
+                    return True
+                except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+                    raise
+                except Exception as e1:
+                    logger.warning(f"Метод 1 не сработал: {e1}")
+                
+                logger.error(f"❌ Все методы присоединения не сработали для: {invite_link}")
+                return False
+            
+            # Метод 2: Публичная ссылка - получаем entity и присоединяемся
             try:
                 entity = await self.client.get_entity(invite_link)
                 await self.client(JoinChannelRequest(entity))
-                logger.info(f"✅ Успешно присоединились (метод 1): {invite_link}")
+                await self.entity_cache.put(entity)
+                logger.info(f"✅ Успешно присоединились (метод 2): {invite_link}")
                 return True
-            except Exception as e1:
-                logger.warning(f"Метод 1 не сработал: {e1}")
-            
-            # Метод 2: Пробуем через ImportChatInviteRequest (для приватных ссылок)
-            try:
-                # Извлекаем хэш из ссылки
-                if "t.me/+" in invite_link:
-                    hash_part = invite_link.split("+")[1]
-                    await self.client(ImportChatInviteRequest(hash_part))
-                    logger.info(f"✅ Успешно присоединились (метод 2): {invite_link}")
-                    return True
+            except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+                raise
             except Exception as e2:
                 logger.warning(f"Метод 2 не сработал: {e2}")
             
@@ -54,12 +253,17 @@ class GroupAnalyzer:
                 await self.client(JoinChannelRequest(invite_link))
                 logger.info(f"✅ Успешно присоединились (метод 3): {invite_link}")
                 return True
+            except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+                raise
             except Exception as e3:
                 logger.warning(f"Метод 3 не сработал: {e3}")
             
             logger.error(f"❌ Все методы присоединения не сработали для: {invite_link}")
             return False
             
+        except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+            # Виноват аккаунт, а не группа - run_check вернет группу в очередь
+            raise
         except Exception as e:
             logger.error(f"❌ Критическая ошибка присоединения к группе {invite_link}: {e}")
             return False
@@ -67,9 +271,13 @@ class GroupAnalyzer:
     async def leave_group(self, group_id):
         """Выходим из группы - УНИВЕРСАЛЬНЫЙ МЕТОД"""
         try:
+            # Сущность из кэша избавляет от повторного поиска группы по ID
+            cached = await self.entity_cache.get(group_id)
+            peer = cached if cached is not None else group_id
+            
             # Метод 1: Пробуем delete_dialog
             try:
-                await self.client.delete_dialog(group_id)
+                await self.client.delete_dialog(peer)
                 logger.info(f"✅ Успешно вышел из группы (метод 1): {group_id}")
                 return True
             except Exception as e1:
@@ -77,7 +285,7 @@ class GroupAnalyzer:
             
             # Метод 2: Пробуем получить entity и выйти
             try:
-                entity = await self.client.get_entity(group_id)
+                entity = await self._resolve_entity(group_id)
                 if isinstance(entity, Channel):
                     await self.client(LeaveChannelRequest(entity))
                 logger.info(f"✅ Успешно вышел из группы (метод 2): {group_id}")
@@ -114,8 +322,9 @@ class GroupAnalyzer:
                 'join_success': True
             }
             
-            # Получаем сущность группы
-            entity = await self.client.get_entity(group_id)
+            # Получаем сущность группы (обычно она уже в кэше после вступления)
+            entity = await self._resolve_entity(group_id)
+            ctx = AnalysisContext(self.client, entity)
             
             # Базовая информация
             result['username'] = getattr(entity, 'username', None)
@@ -123,28 +332,40 @@ class GroupAnalyzer:
             result['group_id'] = group_id
             
             # Определяем год, месяц и день создания группы ПО САМОМУ ПЕРВОМУ СООБЩЕНИЮ
-            date_result = await self._determine_group_date_by_first_message(entity)
+            date_result = await self._determine_group_date_by_first_message(ctx)
             result.update(date_result)
             
             # Проверка на гео-группу
-            geo_result = await self._check_geo_group(entity)
+            geo_result = await self._check_geo_group(ctx)
             result.update(geo_result)
             
             # Проверка на импортированные сообщения
-            imported_result = await self._check_imported_messages_correct(entity)
+            imported_result = await self._check_imported_messages_correct(ctx)
             result.update(imported_result)
             
+            # Глубокая проверка всей истории: импорт мог быть старше окна последних сообщений
+            if USERBOT_DEEP_SCAN and result['imported_status'] != 'critical':
+                deep_scan = await self._deep_scan_imported(ctx)
+                result['deep_scan'] = deep_scan
+                if deep_scan['imported_count'] > 0:
+                    result['has_imported_messages'] = True
+                    result['imported_status'] = 'critical'
+                    result['imported_signs'].insert(0, "Критично: сообщения с флагом 'imported' найдены в старой истории группы")
+            
             # Получаем количество участников
-            participants_result = await self._get_participants_count(entity)
+            participants_result = await self._get_participants_count(ctx)
             result.update(participants_result)
             
             # Анализ сообщений
-            messages_result = await self._analyze_messages(entity)
+            messages_result = await self._analyze_messages(ctx)
             result.update(messages_result)
             
             logger.info(f"✅ UserBot анализ завершен для {result['title']}")
             return result
             
+        except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+            # Виноват аккаунт, а не группа - run_check вернет группу в очередь
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка анализа группы: {e}")
             current_date = datetime.now()
@@ -161,8 +382,9 @@ class GroupAnalyzer:
                 'join_success': False
             }
     
-    async def _determine_group_date_by_first_message(self, entity):
+    async def _determine_group_date_by_first_message(self, ctx):
         """Определяем дату создания группы по самому первому сообщению - САМЫЙ ТОЧНЫЙ МЕТОД"""
+        entity = ctx.entity
         try:
             result = {
                 'group_year': None, 
@@ -172,80 +394,70 @@ class GroupAnalyzer:
                 'creation_method': 'unknown'
             }
             
-            # МЕТОД 1: Ищем самое первое сообщение в группе
+            # МЕТОД 1: Ищем самое раннее сообщение супергруппы по ID сообщений
+            if isinstance(entity, Channel):
+                try:
+                    newest_window = await ctx.get_newest_window()
+                    if newest_window.samples:
+                        estimator = CreationDateEstimator(
+                            ctx.client, entity, CREATION_PROBE_BATCH_SIZE, CREATION_PROBE_MAX_CALLS
+                        )
+                        max_id = max(sample.id for sample in newest_window.samples)
+                        estimate = await estimator.estimate(max_id)
+                        result['creation_probe_calls'] = estimator.calls
+                        
+                        if estimate is not None:
+                            message_id, message_date, confidence = estimate
+                            result['group_year'] = message_date.year
+                            result['group_month'] = message_date.month
+                            result['group_day'] = message_date.day
+                            result['creation_date'] = message_date.isoformat()
+                            result['creation_method'] = 'first_message' if confidence == 'high' else 'message_id_probe'
+                            result['creation_confidence'] = confidence
+                            result['oldest_message_id'] = message_id
+                            
+                            logger.info(f"📅 Дата создания по ID сообщений: {result['group_day']}.{result['group_month']}.{result['group_year']} (id={message_id}, уверенность={confidence}, запросов={estimator.calls})")
+                            return result
+                except Exception as e:
+                    logger.warning(f"Не удалось оценить дату по ID сообщений: {e}")
+            
+            # МЕТОД 2: Ищем самое первое сообщение в группе
             try:
                 logger.info(f"🔍 Ищу самое первое сообщение в группе...")
                 
-                # Получаем сообщения в обратном порядке (от старых к новым)
-                messages = await self.client.get_messages(
-                    entity, 
-                    limit=1, 
-                    reverse=True,  # Это ключевой параметр - получаем самые старые сообщения
-                    offset_date=None
-                )
+                # Окно самых старых сообщений (от старых к новым) загружается один раз
+                oldest_window = await ctx.get_oldest_window()
+                dated_samples = [sample for sample in oldest_window.samples if sample.date]
                 
-                if messages and len(messages) > 0:
-                    first_message = messages[0]
-                    if hasattr(first_message, 'date'):
-                        message_date = first_message.date
-                        result['group_year'] = message_date.year
-                        result['group_month'] = message_date.month
-                        result['group_day'] = message_date.day
-                        result['creation_date'] = message_date.isoformat()
+                if dated_samples:
+                    first_sample = oldest_window.samples[0]
+                    if first_sample.date:
+                        message_date = first_sample.date
                         result['creation_method'] = 'first_message'
-                        
-                        logger.info(f"📅 Дата создания из первого сообщения: {result['group_day']}.{result['group_month']}.{result['group_year']}")
-                        return result
+                        result['creation_confidence'] = 'medium'
                     else:
-                        logger.warning("❌ Первое сообщение не имеет даты")
+                        # Первое сообщение без даты - берем самое старое из окна
+                        message_date = min(sample.date for sample in dated_samples)
+                        result['creation_method'] = 'oldest_message_found'
+                        result['creation_confidence'] = 'low'
+                    
+                    result['oldest_message_id'] = first_sample.id
+                    result['group_year'] = message_date.year
+                    result['group_month'] = message_date.month
+                    result['group_day'] = message_date.day
+                    result['creation_date'] = message_date.isoformat()
+                    
+                    logger.info(f"📅 Дата создания по сообщениям ({result['creation_method']}): {result['group_day']}.{result['group_month']}.{result['group_year']}")
+                    return result
                 else:
                     logger.warning("❌ Не найдено ни одного сообщения в группе")
                     
             except Exception as e:
                 logger.warning(f"Не удалось получить первое сообщение: {e}")
             
-            # МЕТОД 2: Пробуем получить несколько самых старых сообщений
-            try:
-                logger.info(f"🔍 Пробую получить историю сообщений...")
-                
-                # Получаем историю сообщений с начала
-                messages = await self.client.get_messages(
-                    entity, 
-                    limit=10,  # Берем несколько сообщений для надежности
-                    reverse=True,
-                    offset_id=0
-                )
-                
-                if messages and len(messages) > 0:
-                    # Находим самое старое сообщение
-                    oldest_message = None
-                    for message in messages:
-                        if hasattr(message, 'date'):
-                            if oldest_message is None or message.date < oldest_message.date:
-                                oldest_message = message
-                    
-                    if oldest_message:
-                        message_date = oldest_message.date
-                        result['group_year'] = message_date.year
-                        result['group_month'] = message_date.month
-                        result['group_day'] = message_date.day
-                        result['creation_date'] = message_date.isoformat()
-                        result['creation_method'] = 'oldest_message_found'
-                        
-                        logger.info(f"📅 Дата создания из самого старого найденного сообщения: {result['group_day']}.{result['group_month']}.{result['group_year']}")
-                        return result
-                        
-            except Exception as e:
-                logger.warning(f"Не удалось получить историю сообщений: {e}")
-            
             # МЕТОД 3: Пробуем получить дату создания из полной информации о чате
             try:
-                if isinstance(entity, Channel):
-                    full_chat = await self.client(GetFullChannelRequest(entity))
-                else:
-                    full_chat = await self.client(GetFullChatRequest(entity.id))
-                
-                chat_full = full_chat.full_chat
+                chat_full = await ctx.get_full_chat()
                 
                 # Проверяем дату создания
                 if hasattr(chat_full, 'date') and chat_full.date:
@@ -297,18 +509,14 @@ class GroupAnalyzer:
                 'error': str(e)
             }
     
-    async def _check_geo_group(self, entity):
+    async def _check_geo_group(self, ctx):
         """Проверка на гео-группу"""
+        entity = ctx.entity
         result = {'is_geo_group': False, 'geo_reasons': []}
         
         try:
             # Получаем полную информацию о чате
-            if isinstance(entity, Channel):
-                full_chat = await self.client(GetFullChannelRequest(entity))
-            else:
-                full_chat = await self.client(GetFullChatRequest(entity.id))
-            
-            chat_full = full_chat.full_chat
+            chat_full = await ctx.get_full_chat()
             
             # Проверяем гео-данные в полной информации чата
             if hasattr(chat_full, 'location') and chat_full.location:
@@ -325,9 +533,7 @@ class GroupAnalyzer:
                 result['geo_reasons'].append(f"Адрес: {chat_full.address}")
             
             # Косвенные признаки по названию
-            title_lower = getattr(entity, 'title', '').lower()
-            geo_keywords = ['город', 'city', 'москва', 'спб', 'киев', 'moscow', 'kiev']
-            found_keywords = [kw for kw in geo_keywords if kw in title_lower]
+            found_keywords = geo_matcher.find(getattr(entity, 'title', ''))
             if found_keywords:
                 result['geo_reasons'].append(f"Ключевые слова: {', '.join(found_keywords)}")
             
@@ -337,31 +543,28 @@ class GroupAnalyzer:
             
         return result
     
-    async def _check_imported_messages_correct(self, entity):
+    async def _check_imported_messages_correct(self, ctx):
         """Проверяет наличие сообщений, импортированных из других мессенджеров."""
         try:
-            messages = await self.client.get_messages(entity, limit=100)
+            newest_window = await ctx.get_newest_window()
             
             imported_messages_found = False
             imported_warning = False
             imported_signs = []
             saved_from_peer_count = 0
             imported_flag_count = 0
-            total_messages = len(messages)
+            total_messages = len(newest_window)
 
-            for message in messages:
-                if hasattr(message, 'fwd_from') and message.fwd_from:
-                    fwd_from = message.fwd_from
-                    
-                    # КРИТИЧЕСКИЙ ПРИЗНАК: флаг imported (импорт из других мессенджеров)
-                    if hasattr(fwd_from, 'imported') and fwd_from.imported:
-                        imported_flag_count += 1
-                        imported_messages_found = True
-                        imported_signs.append("Критично: сообщения с флагом 'imported' (импорт из других мессенджеров)")
-                    
-                    # ПРЕДУПРЕЖДЕНИЕ: saved_from_peer (пересланные сообщения внутри Telegram)
-                    if hasattr(fwd_from, 'saved_from_peer') and fwd_from.saved_from_peer:
-                        saved_from_peer_count += 1
+            for sample in newest_window.samples:
+                # КРИТИЧЕСКИЙ ПРИЗНАК: флаг imported (импорт из других мессенджеров)
+                if sample.imported:
+                    imported_flag_count += 1
+                    imported_messages_found = True
+                    imported_signs.append("Критично: сообщения с флагом 'imported' (импорт из других мессенджеров)")
+                
+                # ПРЕДУПРЕЖДЕНИЕ: saved_from_peer (пересланные сообщения внутри Telegram)
+                if sample.saved_from_peer:
+                    saved_from_peer_count += 1
 
             # Анализируем saved_from_peer сообщения
             if saved_from_peer_count > 0:
@@ -404,210 +607,485 @@ class GroupAnalyzer:
                 'imported_signs': [f"Ошибка проверки: {str(e)}"]
             }
     
-    async def _get_participants_count(self, entity):
-        """Получаем количество участников"""
+    async def _deep_scan_imported(self, ctx):
+        """Потоковый просмотр истории на импортированные сообщения в пределах бюджета по числу и времени"""
+        scanned = 0
+        imported_count = 0
+        saved_from_peer_count = 0
+        stop_reason = 'history_end'
+        started_at = time.monotonic()
+        
         try:
-            participants = await self.client.get_participants(entity, limit=100)
-            return {'participants_count': len(participants)}
+            # При limit > 3000 Telethon по умолчанию ждет 1 сек между страницами - темп задает лимитер
+            async for message in self.client.iter_messages(ctx.entity, limit=DEEP_SCAN_MAX_MESSAGES, wait_time=0):
+                scanned += 1
+                fwd_from = getattr(message, 'fwd_from', None)
+                if fwd_from:
+                    if getattr(fwd_from, 'saved_from_peer', None):
+                        saved_from_peer_count += 1
+                    if getattr(fwd_from, 'imported', False):
+                        imported_count += 1
+                        stop_reason = 'imported_found'
+                        break
+                
+                if time.monotonic() - started_at > DEEP_SCAN_MAX_SECONDS:
+                    stop_reason = 'time_budget'
+                    break
+            else:
+                if scanned >= DEEP_SCAN_MAX_MESSAGES:
+                    stop_reason = 'message_budget'
+                    
+        except (FloodWaitError,) + FATAL_ACCOUNT_ERRORS:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Глубокая проверка истории прервана: {e}")
+            stop_reason = 'error'
+        
+        elapsed = time.monotonic() - started_at
+        logger.info(f"🔬 Глубокая проверка: просмотрено {scanned}, imported={imported_count}, saved_peer={saved_from_peer_count}, остановка={stop_reason}, {elapsed:.1f} сек")
+        
+        return {
+            'scanned': scanned,
+            'imported_count': imported_count,
+            'saved_from_peer_count': saved_from_peer_count,
+            'complete': stop_reason in ('history_end', 'imported_found'),
+            'stop_reason': stop_reason,
+            'seconds': round(elapsed, 1)
+        }
+    
+    async def _get_participants_count(self, ctx):
+        """Получаем количество участников без загрузки списка участников"""
+        entity = ctx.entity
+        
+        # Число участников уже есть в полной информации о чате
+        try:
+            chat_full = await ctx.get_full_chat()
+            
+            # Супергруппы и каналы: счетчик в ChannelFull
+            count = getattr(chat_full, 'participants_count', None)
+            if count is None:
+                # Обычные группы: список участников приходит вместе с ChatFull
+                participants = getattr(getattr(chat_full, 'participants', None), 'participants', None)
+                if participants is not None:
+                    count = len(participants)
+            if count is None:
+                count = getattr(entity, 'participants_count', None)
+            
+            if count is not None:
+                return {'participants_count': count}
+        except Exception as e:
+            logger.warning(f"Не удалось получить число участников из full_chat: {e}")
+        
+        try:
+            # limit=0 возвращает только общее количество, без самих участников
+            participants = await self.client.get_participants(entity, limit=0)
+            return {'participants_count': participants.total}
         except Exception as e:
             logger.error(f"❌ Ошибка получения участников: {e}")
             return {'participants_count': 0}
     
-    async def _analyze_messages(self, entity):
+    async def _analyze_messages(self, ctx):
         """Анализ сообщений группы"""
         try:
-            # Получаем больше сообщений для статистики
-            messages = await self.client.get_messages(entity, limit=100)
-            total_messages = len(messages)
+            # То же окно последних сообщений, что и у проверки импорта
+            newest_window = await ctx.get_newest_window()
+            total_messages = len(newest_window)
             
-            # Пробуем получить общее количество сообщений
-            try:
-                # Для каналов
-                if isinstance(entity, Channel):
-                    full_chat = await self.client(GetFullChannelRequest(entity))
-                    message_count = getattr(full_chat.full_chat, 'participants_count', total_messages)
-                else:
-                    # Для групп
-                    full_chat = await self.client(GetFullChatRequest(entity.id))
-                    message_count = getattr(full_chat.full_chat, 'participants_count', total_messages)
-            except:
-                message_count = total_messages
+            # Общее количество сообщений Telegram возвращает вместе с окном
+            message_count = newest_window.total
             
             return {
                 'message_count': message_count,
-                'total_messages_analyzed': total_messages
+                'total_messages_analyzed': total_messages,
+                # ID последнего сообщения нужен веб-проверке основного бота
+                'newest_message_id': newest_window.samples[0].id if total_messages else None
             }
         except Exception as e:
             logger.error(f"❌ Ошибка анализа сообщений: {e}")
             return {
                 'message_count': 0,
-                'total_messages_analyzed': 0
+                'total_messages_analyzed': 0,
+                'newest_message_id': None
             }
 
-# Глобальная переменная для доступа к analyzer
-analyzer = None
+# Пул аккаунтов UserBot: у каждого свой клиент, лимитер запросов и кэш сущностей
+account_pool = AccountPool()
 
-async def start_userbot():
-    """Запуск UserBot с авторизацией по номеру телефона"""
-    global analyzer
-    
-    client = TelegramClient(USERBOT_SESSION_FILE, USERBOT_API_ID, USERBOT_API_HASH)
+def create_account(session_file, client):
+    """Собираем аккаунт пула вокруг авторизованного клиента"""
+    # Бюджеты запросов и FloodWait Telegram считает для каждого аккаунта отдельно
+    limiter = TelegramRateLimiter(USERBOT_RATE_LIMITS, USERBOT_MAX_FLOOD_WAIT, name=session_file)
+    cache = EntityCache(session_file, ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+    analyzer = GroupAnalyzer(RateLimitedClient(client, limiter), cache)
+    return UserbotAccount(session_file, client, analyzer, limiter, cache, USERBOT_CONCURRENCY)
+
+# Команда одноразовой интерактивной авторизации аккаунтов
+LOGIN_FLAG = "--login"
+
+async def start_userbot(session_file):
+    """Запуск одного аккаунта UserBot по уже авторизованной сессии (без ввода с клавиатуры)"""
+    client = TelegramClient(session_file, USERBOT_API_ID, USERBOT_API_HASH)
     
     try:
-        print("\n🔐 **АВТОРИЗАЦИЯ USERBOT** 🔐")
-        print("=" * 40)
-        
-        # Запускаем клиент
-        await client.start()
-        
-        # Если пользователь уже авторизован
-        if await client.is_user_authorized():
-            me = await client.get_me()
-            logger.info(f"✅ UserBot уже авторизован как: {me.first_name} (@{me.username})")
-            print(f"✅ Авторизован как: {me.first_name} (@{me.username})")
-            analyzer = GroupAnalyzer(client)
-            return client
-        
-        # Если не авторизован - запрашиваем номер
-        print("\n📱 Введите номер телефона в международном формате:")
-        print("Пример: +79123456789")
+        # connect() не спрашивает номер и код, в отличие от start()
+        await client.connect()
         
-        phone = input("Номер телефона: ").strip()
+        if not await client.is_user_authorized():
+            await client.disconnect()
+            logger.error(f"❌ Сессия {session_file} не авторизована. Выполните один раз: python userbot.py {LOGIN_FLAG} {session_file}")
+            print(f"❌ Сессия {session_file} не авторизована: python userbot.py {LOGIN_FLAG} {session_file}")
+            return None
         
-        # Отправляем код
-        await client.send_code_request(phone)
-        print(f"\n📨 Код отправлен на номер: {phone}")
-        
-        # Запрашиваем код
-        code = input("Введите код из Telegram: ").strip()
+        me = await client.get_me()
+        logger.info(f"✅ UserBot уже авторизован как: {me.first_name} (@{me.username})")
+        print(f"✅ [{session_file}] Авторизован как: {me.first_name} (@{me.username})")
+        return create_account(session_file, client)
         
-        # Авторизуемся
-        await client.sign_in(phone, code)
+    except Exception as e:
+        logger.error(f"❌ Ошибка запуска сессии {session_file}: {e}")
+        print(f"❌ Ошибка запуска сессии {session_file}: {e}")
+        await client.disconnect()
+        return None
+
+async def login_userbot(session_file):
+    """Одноразовая интерактивная авторизация аккаунта: номер телефона, код, пароль 2FA"""
+    client = TelegramClient(session_file, USERBOT_API_ID, USERBOT_API_HASH)
+    
+    print(f"\n🔐 **АВТОРИЗАЦИЯ USERBOT** ({session_file}) 🔐")
+    print("=" * 40)
+    
+    try:
+        # Для уже авторизованной сессии start() ничего не спрашивает
+        await client.start(
+            phone=lambda: input("📱 Номер телефона в международном формате (пример: +79123456789): ").strip(),
+            code_callback=lambda: input("Введите код из Telegram: ").strip()
+        )
         
-        # Получаем информацию о пользователе
         me = await client.get_me()
         logger.info(f"✅ UserBot успешно авторизован как: {me.first_name} (@{me.username})")
         print(f"✅ Успешная авторизация: {me.first_name} (@{me.username})")
-        
-        analyzer = GroupAnalyzer(client)
-        return client
+        print(f"💾 Сессия сохранена в {session_file}.session - дальше UserBot запускается без ввода")
+        return True
         
     except Exception as e:
         logger.error(f"❌ Ошибка авторизации UserBot: {e}")
         print(f"❌ Ошибка авторизации: {e}")
-        return None
+        return False
+    finally:
+        await client.disconnect()
 
-async def process_pending_checks():
-    """Обработка ожидающих проверок"""
-    global analyzer
+async def process_check(check, account):
+    """Полная обработка одной группы из очереди: вход, анализ, сохранение, выход"""
+    analyzer = account.analyzer
+    
+    queue_id, group_id, group_title, user_id, invite_link, status, created_at = check
+    
+    # Проверяем, нет ли уже результатов для этой группы
+    existing_result = await get_userbot_result(group_id)
+    if existing_result:
+        print(f"⏩ Пропускаем группу {group_title} - уже есть результаты")
+        await update_queue_status(queue_id, "userbot_done")
+        await result_publisher.publish(group_id, existing_result)
+        return True
+    
+    print(f"🔄 Обрабатываю группу: {group_title} (аккаунт {account.name})")
+    logger.info(f"🔄 Обрабатываем группу: {group_title} (аккаунт {account.name})")
+    
+    # Присоединяемся к группе
+    print(f"🔗 Пытаюсь присоединиться по ссылке: {invite_link}")
+    join_success = await analyzer.join_group(invite_link)
+    
+    # FloodWait и бан аккаунта join_group пробрасывает - здесь остаются только отказы самой группы
+    if not join_success:
+        # Если не удалось присоединиться - повторяем позже с нарастающей паузой
+        status, attempts, next_attempt_at = await retry_check(queue_id)
+        if status == "pending":
+            logger.warning(f"🔁 Не удалось присоединиться к группе {group_title}, попытка {attempts}: повтор через {next_attempt_at - time.time():.0f} сек")
+            print(f"🔁 Не удалось присоединиться к группе: {group_title}, повторю позже")
+        else:
+            logger.error(f"❌ Не удалось присоединиться к группе: {group_title} (попыток: {attempts})")
+            print(f"❌ Не удалось присоединиться к группе: {group_title}")
+        return False
+    
+    print(f"✅ Успешно присоединился к группе: {group_title}")
+    await add_membership(account.name, group_id)
+    
+    # Даем Telegram применить вступление перед анализом
+    await asyncio.sleep(USERBOT_JOIN_SETTLE_DELAY)
+    
+    # Анализируем группу
+    print(f"🔍 Начинаю анализ группы: {group_title}")
+    userbot_result = await analyzer.analyze_group(group_id)
+    
+    # Сохраняем результат
+    await save_check_result(
+        group_id=group_id,
+        group_title=group_title,
+        user_id=user_id,
+        bot_result={},
+        userbot_result=userbot_result,
+        final_result=False,
+        issues="",
+        queue_id=queue_id
+    )
     
+    # Обновляем статус
+    await update_queue_status(queue_id, "userbot_done")
+    
+    # Сразу сообщаем основному боту, что результат готов
+    await result_publisher.publish(group_id, userbot_result)
+    
+    print(f"✅ Анализ завершен: {group_title}")
+    logger.info(f"✅ UserBot завершил проверку группы: {group_title}")
+    
+    # После проверки выходим из группы (если не вышло - группу подберет уборка)
+    if await analyzer.leave_group(group_id):
+        await remove_membership(account.name, group_id)
+        print(f"🚪 Вышел из группы: {group_title}")
+        logger.info(f"✅ UserBot вышел из группы после проверки: {group_title}")
+    else:
+        print(f"⚠️ Не удалось выйти из группы: {group_title}")
+    
+    return True
+
+async def run_check(worker_id, check, account):
+    """Обработка группы аккаунтом с ограничением по времени; возвращает успех проверки"""
+    queue_id, group_title = check[0], check[2]
+    try:
+        return await asyncio.wait_for(process_check(check, account), USERBOT_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        await update_queue_status(queue_id, "failed")
+        logger.error(f"⏰ Воркер {worker_id}: превышено время проверки группы {group_title} ({USERBOT_CHECK_TIMEOUT} сек)")
+    except FloodWaitError as e:
+        # Лимитер уже вывел аккаунт из работы на время FloodWait
+        await update_queue_status(queue_id, "pending")
+        logger.warning(f"♻️ Воркер {worker_id}: группа {group_title} возвращена в очередь после FloodWait {e.seconds} сек")
+    except FATAL_ACCOUNT_ERRORS as e:
+        # Аккаунт отключен - группу проверит другой аккаунт
+        await update_queue_status(queue_id, "pending")
+        logger.warning(f"♻️ Воркер {worker_id}: группа {group_title} возвращена в очередь, аккаунт {account.name} недоступен: {e}")
+    except Exception as e:
+        await update_queue_status(queue_id, "failed")
+        logger.error(f"❌ Воркер {worker_id}: ошибка проверки группы {group_title}: {e}")
+    return False
+
+async def queue_worker(worker_id):
+    """Воркер очереди: берет наименее загруженный аккаунт пула и отдает ему следующую группу"""
     while True:
         try:
-            pending_checks = get_pending_checks()
-            
-            if pending_checks:
-                print(f"📋 Найдено групп в очереди: {len(pending_checks)}")
+            account = await account_pool.acquire(USERBOT_QUEUE_POLL_INTERVAL)
+            if account is None:
+                logger.error(f"⛔ Воркер {worker_id}: в пуле не осталось рабочих аккаунтов")
+                return
             
-            for check in pending_checks:
-                queue_id, group_id, group_title, user_id, invite_link, status, created_at = check
-                
-                # Проверяем, нет ли уже результатов для этой группы
-                existing_result = get_userbot_result(group_id)
-                if existing_result:
-                    print(f"⏩ Пропускаем группу {group_title} - уже есть результаты")
-                    update_queue_status(queue_id, "userbot_done")
-                    continue
-                
-                print(f"🔄 Обрабатываю группу: {group_title}")
-                logger.info(f"🔄 Обрабатываем группу: {group_title}")
-                
-                # Обновляем статус
-                update_queue_status(queue_id, "processing")
-                
-                # Присоединяемся к группе
-                print(f"🔗 Пытаюсь присоединиться по ссылке: {invite_link}")
-                join_success = await analyzer.join_group(invite_link)
-                
-                if join_success:
-                    print(f"✅ Успешно присоединился к группе: {group_title}")
-                    
-                    # Ждем немного перед анализом
-                    await asyncio.sleep(3)
-                    
-                    # Анализируем группу
-                    print(f"🔍 Начинаю анализ группы: {group_title}")
-                    userbot_result = await analyzer.analyze_group(group_id)
-                    
-                    # Сохраняем результат
-                    save_check_result(
-                        group_id=group_id,
-                        group_title=group_title,
-                        user_id=user_id,
-                        bot_result={},
-                        userbot_result=userbot_result,
-                        final_result=False,
-                        issues=""
-                    )
-                    
-                    # Обновляем статус
-                    update_queue_status(queue_id, "userbot_done")
-                    
-                    print(f"✅ Анализ завершен: {group_title}")
-                    logger.info(f"✅ UserBot завершил проверку группы: {group_title}")
-                    
-                    # Ждем перед выходом
-                    await asyncio.sleep(2)
-                    
-                    # После проверки выходим из группы
-                    try:
-                        await analyzer.leave_group(group_id)
-                        print(f"🚪 Вышел из группы: {group_title}")
-                        logger.info(f"✅ UserBot вышел из группы после проверки: {group_title}")
-                    except Exception as e:
-                        logger.error(f"❌ Ошибка выхода из группы после проверки: {e}")
-                        print(f"⚠️ Не удалось выйти из группы: {e}")
-                        
-                else:
-                    # Если не удалось присоединиться
-                    update_queue_status(queue_id, "failed")
-                    logger.error(f"❌ Не удалось присоединиться к группе: {group_title}")
-                    print(f"❌ Не удалось присоединиться к группе: {group_title}")
+            check = None
+            success = None
+            try:
+                check = await claim_next_check(account.name)
+                if check is not None:
+                    success = await run_check(worker_id, check, account)
+            finally:
+                if account.limiter.fatal_error is not None:
+                    account.ban(account.limiter.fatal_error)
+                await account_pool.release(account, success)
             
-            # Случайная задержка между проверками
-            delay = random.uniform(10, 20)
-            print(f"⏳ Следующая проверка через {delay:.1f} секунд...")
-            await asyncio.sleep(delay)
+            if check is None:
+                # В режиме одного процесса основной бот будит воркеры сразу после постановки в очередь
+                await sync_manager.wait_for_new_check(USERBOT_QUEUE_POLL_INTERVAL)
             
         except Exception as e:
             logger.error(f"❌ Ошибка в процессе проверки: {e}")
             print(f"❌ Ошибка: {e}")
             await asyncio.sleep(10)
 
-async def main_userbot():
-    """Основная функция UserBot"""
-    global analyzer
+async def report_userbot_stats():
+    """Периодически пишем в лог счетчики аккаунтов пула, лимитеров и кэшей сущностей"""
+    while True:
+        await asyncio.sleep(USERBOT_STATS_INTERVAL)
+        logger.info(f"📈 Аккаунты: {account_pool.summary()}")
+        try:
+            stats = await get_queue_wait_stats()
+            logger.info(f"📈 Очередь: {format_queue_wait_stats(stats)}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения статистики очереди: {e}")
+        for account in account_pool.accounts:
+            logger.info(f"📈 [{account.name}] Лимитер запросов: {account.limiter.summary()}")
+            logger.info(f"📈 [{account.name}] Кэш сущностей: {account.entity_cache.summary()}")
+
+async def leave_group_everywhere(group_id):
+    """Выходим из группы всеми аккаунтами пула, которые в ней состоят; возвращаем статус выхода"""
+    members = set(await get_group_members(group_id))
+    accounts = [account for account in account_pool.accounts if account.name in members]
+    
+    if not accounts:
+        # Вступление до учета членства: ищем аккаунты, которым группа знакома по кэшу сущностей
+        for account in account_pool.accounts:
+            if await account.entity_cache.get(group_id) is not None:
+                accounts.append(account)
     
+    if not accounts:
+        logger.info(f"ℹ️ Ни один аккаунт не состоит в группе {group_id}")
+        return "done"
+    
+    status = "done"
+    for account in accounts:
+        if not account.is_alive():
+            status = "failed"
+            continue
+        if await account.analyzer.leave_group(group_id):
+            await remove_membership(account.name, group_id)
+            logger.info(f"🚪 Аккаунт {account.name} вышел из группы {group_id}")
+        else:
+            status = "failed"
+    return status
+
+async def leave_queue_worker():
+    """Разбираем очередь выхода пачками; темп выходов задает лимитер аккаунта"""
+    while True:
+        try:
+            batch = await claim_leave_batch(LEAVE_BATCH_SIZE)
+            for leave_id, group_id, reason in batch:
+                try:
+                    status = await leave_group_everywhere(group_id)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка выхода из группы {group_id}: {e}")
+                    status = "failed"
+                await update_leave_status(leave_id, status)
+            
+            if batch:
+                logger.info(f"🚪 Обработано выходов из групп: {len(batch)}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки очереди выхода: {e}")
+        
+        await asyncio.sleep(LEAVE_QUEUE_INTERVAL)
+
+async def sweep_account_dialogs(account):
+    """Сверяем диалоги аккаунта с очередью проверок; ненужные группы ставим в очередь выхода"""
+    finished_groups = await get_finished_check_groups()
+    known_memberships = await get_account_memberships(account.name)
+    
+    dialog_groups = set()
+    async for dialog in account.analyzer.client.iter_dialogs():
+        if dialog.is_group or dialog.is_channel:
+            dialog_groups.add(dialog.id)
+    
+    # Учет членства мог разойтись с Telegram (выход вручную, кик, сбой) - правим его
+    for group_id in known_memberships - dialog_groups:
+        await remove_membership(account.name, group_id)
+    
+    # Трогаем только группы, в которые вступали ради проверки, и только после ее завершения
+    queued = 0
+    for group_id in dialog_groups & finished_groups:
+        await add_membership(account.name, group_id)
+        if await add_to_leave_queue_once(group_id, "sweep"):
+            queued += 1
+    
+    logger.info(f"🧹 [{account.name}] Диалогов-групп: {len(dialog_groups)}, поставлено в очередь выхода: {queued}")
+
+async def sweep_dialogs():
+    """Периодическая уборка: число диалогов аккаунтов не растет бесконечно"""
+    while True:
+        # Кэш сущностей тоже не растет бесконечно: устаревшие записи удаляем при каждой уборке
+        try:
+            pruned = await prune_entity_cache(ENTITY_CACHE_TTL)
+            if pruned:
+                logger.info(f"🧹 Удалено устаревших записей кэша сущностей: {pruned}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки кэша сущностей: {e}")
+        
+        for account in account_pool.accounts:
+            if not account.is_usable():
+                continue
+            try:
+                await sweep_account_dialogs(account)
+            except Exception as e:
+                logger.error(f"❌ [{account.name}] Ошибка уборки диалогов: {e}")
+        
+        await asyncio.sleep(LEAVE_SWEEP_INTERVAL)
+
+async def process_pending_checks():
+    """Обработка ожидающих проверок: по USERBOT_CONCURRENCY воркеров на аккаунт пула"""
+    # Строки в статусе processing остались от предыдущего запуска - их никто не обрабатывает
+    requeued = await requeue_stale_checks()
+    if requeued:
+        logger.info(f"♻️ Возвращено в очередь незавершенных проверок: {requeued}")
+    requeued = await requeue_stale_leaves()
+    if requeued:
+        logger.info(f"♻️ Возвращено в очередь незавершенных выходов: {requeued}")
+    
+    worker_count = USERBOT_CONCURRENCY * len(account_pool.accounts)
+    print(f"👷 Запускаю воркеров очереди: {worker_count} (аккаунтов: {len(account_pool.accounts)})")
+    workers = [asyncio.create_task(queue_worker(i + 1)) for i in range(worker_count)]
+    workers.append(asyncio.create_task(report_userbot_stats()))
+    workers.append(asyncio.create_task(leave_queue_worker()))
+    workers.append(asyncio.create_task(sweep_dialogs()))
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+async def start_accounts():
+    """Запускаем аккаунты пула; возвращаем True, если запустился хотя бы один"""
     print("🚀 ЗАПУСК USERBOT")
     print("=" * 40)
     
-    client = await start_userbot()
-    if client and analyzer:
-        print("\n✅ UserBot успешно запущен и авторизован!")
+    # Сессии подключаются параллельно; аккаунт, который не удалось запустить,
+    # пропускаем - работают остальные
+    accounts = await asyncio.gather(*(start_userbot(session_file) for session_file in USERBOT_SESSION_FILES))
+    for account in accounts:
+        if account:
+            account_pool.add(account)
+    
+    if not account_pool.accounts:
+        print("\n❌ Не удалось запустить UserBot!")
+        print("💡 Проверьте:")
+        print("   - API_ID и API_HASH в config.py")
+        print(f"   - Авторизацию сессий: python userbot.py {LOGIN_FLAG}")
+        return False
+    
+    return True
+
+async def stop_accounts():
+    """Отключаем клиенты аккаунтов пула"""
+    for account in account_pool.accounts:
+        try:
+            await account.client.disconnect()
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось отключить аккаунт {account.name}: {e}")
+
+async def main_userbot(heartbeat=None):
+    """Основная функция UserBot"""
+    # Сигналы жизни идут с самого начала: зависание на авторизации тоже заметно супервизору
+    if heartbeat is not None:
+        heartbeat.start()
+    
+    if await start_accounts():
+        print(f"\n✅ UserBot успешно запущен и авторизован! Аккаунтов в пуле: {len(account_pool.accounts)}")
         print("🔄 Начинаю обработку очереди проверок...")
         print("💡 UserBot будет автоматически проверять группы из очереди")
         print("⏳ Ожидайте добавления групп в очередь через основного бота\n")
         
-        await process_pending_checks()
-    else:
-        print("\n❌ Не удалось запустить UserBot!")
-        print("💡 Проверьте:")
-        print("   - API_ID и API_HASH в config.py")
-        print("   - Правильность введенного номера телефона")
-        print("   - Правильность кода подтверждения")
+        try:
+            await process_pending_checks()
+        finally:
+            result_publisher.close()
+            await stop_accounts()
+            await close_db()
+
+async def login_accounts(session_files):
+    """Авторизуем сессии по очереди (ввод с клавиатуры нужен только здесь)"""
+    for session_file in session_files:
+        await login_userbot(session_file)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main_userbot())
+        if LOGIN_FLAG in sys.argv[1:]:
+            # python userbot.py --login [сессия ...] - без списка авторизуем все сессии пула
+            sessions = [arg for arg in sys.argv[1:] if arg != LOGIN_FLAG] or USERBOT_SESSION_FILES
+            asyncio.run(login_accounts(sessions))
+        else:
+            asyncio.run(main_userbot())
     except KeyboardInterrupt:
         print("\n\n👋 UserBot остановлен пользователем")
     except Exception as e: